@@ -0,0 +1,50 @@
+"""Compare the size of the old `str(pages)` document context with the normalized one.
+
+Usage:
+    python -m benchmarks.document_benchmark [--pdf docs/portone_docs.pdf]
+
+Reports characters and estimated tokens of the full-mode document context and of the
+retrieval chunks, before and after normalization, plus the boilerplate lines removed.
+"""
+import argparse, time
+from utils.documents import extract_pdf_pages, find_boilerplate, format_pages, normalize_pages
+from utils.retrieval import DocumentIndex, estimate_tokens
+
+
+def _row(label, before, after):
+    saved = 1 - after / before if before else 0.0
+    print(f"{label:<22} {before:>10} {after:>10} {saved:>8.1%}")
+
+
+def run(pdf_path):
+    start_time = time.perf_counter()
+    pages, _ = extract_pdf_pages(pdf_path)
+    extract_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    boilerplate = find_boilerplate(pages)
+    normalized = normalize_pages(pages)
+    context = format_pages(normalized)
+    normalize_seconds = time.perf_counter() - start_time
+    legacy_context = str(pages)
+
+    raw_chunks = "".join(DocumentIndex().build(pages).chunk_texts)
+    normalized_chunks = "".join(DocumentIndex().build(normalized).chunk_texts)
+
+    print(f"pages:        {len(pages)} (extracted in {extract_seconds:.2f}s, normalized in {normalize_seconds * 1000:.1f}ms)")
+    print(f"boilerplate:  {len(boilerplate)} repeated header/footer lines: {sorted(boilerplate)[:5]}")
+    print(f"{'':<22} {'before':>10} {'after':>10} {'saved':>8}")
+    _row("context chars", len(legacy_context), len(context))
+    _row("context tokens (est.)", estimate_tokens(legacy_context), estimate_tokens(context))
+    _row("chunk chars", len(raw_chunks), len(normalized_chunks))
+    _row("chunk tokens (est.)", estimate_tokens(raw_chunks), estimate_tokens(normalized_chunks))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default="docs/portone_docs.pdf")
+    run(parser.parse_args().pdf)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Local stand-ins for Gemini, Redis and the chat platforms used by the load-test harness."""
+import asyncio, itertools, random, threading, time
+from types import SimpleNamespace
+import discord
+from utils.redis import RedisService
+
+WORDS = (
+    "payment link api key webhook signature refund checkout dashboard sdk merchant "
+    "request response token currency order status callback integration sandbox"
+).split()
+
+
+class FakeGeminiModel:
+    """Mimics `GenerativeModel.generate_content` with configurable latency and output size.
+
+    Latency is `latency` seconds to the first token plus `output_tokens / tokens_per_second`
+    for the rest, with +/- `jitter` relative noise. Prompt sizes are recorded for reporting.
+    """
+
+    def __init__(self, latency=0.5, output_tokens=300, tokens_per_second=200.0, jitter=0.2, seed=0):
+        self.latency = latency
+        self.output_tokens = output_tokens
+        self.tokens_per_second = tokens_per_second
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.prompt_bytes = []
+
+    def _noise(self):
+        with self._lock:
+            return 1.0 + self._random.uniform(-self.jitter, self.jitter)
+
+    def _words(self, count):
+        with self._lock:
+            return [self._random.choice(WORDS) for _ in range(count)]
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        with self._lock:
+            self.prompt_bytes.append(len(str(contents).encode("utf-8")))
+        time.sleep(self.latency * self._noise())
+        if stream:
+            return self._stream()
+        time.sleep(self.output_tokens / self.tokens_per_second * self._noise())
+        return SimpleNamespace(text=" ".join(self._words(self.output_tokens)))
+
+    def _stream(self, tokens_per_chunk=20):
+        for _ in range(0, self.output_tokens, tokens_per_chunk):
+            time.sleep(tokens_per_chunk / self.tokens_per_second * self._noise())
+            yield SimpleNamespace(text=" ".join(self._words(tokens_per_chunk)) + " ")
+
+
+def fake_redis_service():
+    """Return a RedisService backed by an in-memory fakeredis server."""
+    from fakeredis import FakeAsyncRedis  # Benchmark-only dependency
+    return RedisService(redis_url=None, client=FakeAsyncRedis(decode_responses=True))
+
+
+class FakeSentMessage:
+    def __init__(self, content):
+        self.content = content
+        self.edits = 0
+
+    async def edit(self, content=None, **kwargs):
+        self.content = content
+        self.edits += 1
+        return self
+
+
+class _FakeTyping:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class _FakeMessageable:
+    """Records what the bot sends instead of calling Discord."""
+
+    def _setup(self, channel_id, send_latency):
+        self.id = channel_id
+        self.send_latency = send_latency
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        await asyncio.sleep(self.send_latency)
+        message = FakeSentMessage(content)
+        self.sent.append(message)
+        return message
+
+    def typing(self):
+        return _FakeTyping()
+
+
+class FakeTextChannel(_FakeMessageable):
+    def __init__(self, channel_id, send_latency=0.05):
+        self._setup(channel_id, send_latency)
+
+
+class FakeDMChannel(_FakeMessageable, discord.DMChannel):
+    """Passes the bot's `isinstance(channel, discord.DMChannel)` check without a gateway connection."""
+
+    def __init__(self, channel_id, send_latency=0.05):
+        self._setup(channel_id, send_latency)
+
+
+_message_ids = itertools.count(1)
+
+# The bot's own account; the harness installs it because the fake client never logs in
+FAKE_BOT_USER = SimpleNamespace(id=999, bot=True, name="docs-bot")
+
+
+def fake_discord_message(text, user_id, channel, bot_user=None, mention=False):
+    """Build a minimal object with the attributes `DiscordBot.on_message` reads."""
+    return SimpleNamespace(
+        id=next(_message_ids),
+        content=text,
+        author=SimpleNamespace(id=user_id, bot=False),
+        channel=channel,
+        guild=None if isinstance(channel, discord.DMChannel) else SimpleNamespace(id=1),
+        mentions=[bot_user] if mention and bot_user is not None else [],
+    )
+
+
+class FakeSlackSay:
+    """Stands in for Bolt's `say`, returning a message timestamp like the Web API does."""
+
+    def __init__(self, send_latency=0.05):
+        self.send_latency = send_latency
+        self.sent = []
+        self._ts = itertools.count(1)
+
+    async def __call__(self, text=None, channel=None, thread_ts=None, **kwargs):
+        await asyncio.sleep(self.send_latency)
+        self.sent.append(text)
+        return {"ok": True, "ts": f"{time.time():.0f}.{next(self._ts):06d}"}
+
+
+def fake_slack_event(text, user_id, channel, mention=False, dm=False):
+    """Build a Slack message (or app_mention) event payload."""
+    ts = f"{time.time():.6f}"
+    return {
+        "type": "app_mention" if mention else "message",
+        "channel_type": "im" if dm else "channel",
+        "user": user_id,
+        "text": text,
+        "channel": channel,
+        "ts": ts,
+        "client_msg_id": f"{user_id}-{ts}",
+        "event_ts": ts,
+    }
@@ -0,0 +1,261 @@
+"""Offline load test of the Discord and Slack bots against local stand-ins.
+
+Replays a JSONL request corpus through `DiscordBot.on_message` and
+`SlackBot._handle_message` at a fixed rate, with a fake Gemini model and an
+in-memory Redis, and reports latency percentiles, throughput, prompt size and
+event-loop lag (including logging overhead). Needs the document PDF and `pip install -r benchmarks/requirements.txt`.
+
+Usage:
+    python -m benchmarks.load_test --generate 500 --rate 20
+    python -m benchmarks.load_test --corpus benchmarks/sample_corpus.jsonl --rate 50 --latency 1.0
+
+Corpus lines look like:
+    {"platform": "discord", "text": "How do I get API keys?", "user": "u1", "channel": "c1", "dm": false, "mention": true}
+"""
+import argparse, asyncio, json, random, statistics, time
+from benchmarks.fakes import (
+    FAKE_BOT_USER, FakeDMChannel, FakeGeminiModel, FakeSlackSay, FakeTextChannel,
+    fake_discord_message, fake_redis_service, fake_slack_event,
+)
+from benchmarks.loop_lag import LoopLagMonitor, percentile
+from discord_bot.discord_bot import DiscordBot
+from slack_bot.slack_bot import SlackBot
+from utils.answer_cache import AnswerCache
+from utils.dedup import EventDeduplicator
+from utils.gemini import GeminiService
+from utils.logging import Logger
+from utils.memory import ConversationMemory
+from utils.relevance import RelevanceGate
+from utils.metrics import DELIVERY_SECONDS, STAGE_SECONDS
+from utils.scheduler import GeminiScheduler
+from utils.singleflight import SingleFlight
+
+QUESTIONS = [
+    "How do I get my API keys?",
+    "how do i get api keys",
+    "How do I verify the webhook signature?",
+    "Which payment methods are supported in Vietnam?",
+    "How do I create a payment link from the dashboard?",
+    "How do I integrate the Android SDK?",
+    "What does the refund API return on failure?",
+    "How do I test payments in the sandbox?",
+    "Can I customise the checkout page?",
+    "What currencies are supported?",
+]
+CHATTER = ["thanks!", "lol", "good morning", "ok", "see you tomorrow"]
+
+
+def generate_corpus(count, users=50, channels=10, seed=0):
+    """Generate a synthetic corpus mixing repeated doc questions, DMs, mentions and chatter."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        chatter = rng.random() < 0.2
+        corpus.append({
+            "platform": rng.choice(["discord", "slack"]),
+            "text": rng.choice(CHATTER if chatter else QUESTIONS),
+            "user": f"user-{rng.randrange(users)}",
+            "channel": f"channel-{rng.randrange(channels)}",
+            "dm": rng.random() < 0.3,
+            "mention": not chatter and rng.random() < 0.5,
+        })
+    return corpus
+
+
+def load_corpus(path):
+    with open(path) as corpus_file:
+        return [json.loads(line) for line in corpus_file if line.strip()]
+
+
+class Harness:
+    """Wires the real bots and services to the fakes and drives synthetic events through them."""
+
+    def __init__(self, args):
+        self.args = args
+        self.logger = Logger.get_logger(name=__name__, log_level="DEBUG", log_file="logs/load_test.log")
+        self.model = FakeGeminiModel(
+            latency=args.latency, output_tokens=args.output_tokens, tokens_per_second=args.tokens_per_second
+        )
+        self.redis_service = fake_redis_service()
+        self.answer_cache = AnswerCache(self.redis_service) if args.answer_cache else None
+        self.scheduler = GeminiScheduler(
+            max_concurrency=args.concurrency,
+            max_queue=args.max_queue,
+            user_rate=args.user_rate,
+            channel_rate=args.channel_rate,
+        )
+        self.gemini_service = GeminiService(
+            api_key="load-test",
+            retrieval_mode=args.retrieval_mode,
+            doc_cache_dir=args.doc_cache_dir,
+            answer_cache=self.answer_cache,
+            single_flight=SingleFlight(),
+            scheduler=self.scheduler,
+            pdf_path=args.pdf,
+            sitemap_path=args.sitemap,
+        )
+        self.gemini_service.model_flash = self.model
+        self.memory = ConversationMemory(
+            self.redis_service, summarizer=self.gemini_service.summarize, token_budget=args.memory_budget
+        )
+        self.relevance_gate = RelevanceGate(self.gemini_service, default_mode=args.relevance_mode)
+
+        self.discord_bot = DiscordBot(
+            redis_service=self.redis_service, gemini_service=self.gemini_service, memory=self.memory,
+            relevance_gate=self.relevance_gate, streaming=args.streaming,
+        )
+        self.discord_bot.process_commands = self._no_commands
+        # `DiscordBot.user` is None until login; mentions are only recognized with a bot user
+        self.discord_bot._connection.user = FAKE_BOT_USER
+        self.slack_bot = SlackBot(
+            gemini_service=self.gemini_service,
+            redis_service=self.redis_service,
+            slack_bot_token="xoxb-load-test",
+            slack_signing_secret="load-test",
+            memory=self.memory,
+            relevance_gate=self.relevance_gate,
+            streaming=args.streaming,
+            deduplicator=EventDeduplicator(self.redis_service.client),
+        )
+        self.slack_bot.app.client.chat_update = self._slack_chat_update
+        self.slack_say = FakeSlackSay(send_latency=args.send_latency)
+        self.channels = {}
+        self.latencies = {"discord": [], "slack": []}
+        self.errors = 0
+
+    async def _no_commands(self, message):
+        return None
+
+    async def _slack_chat_update(self, **kwargs):
+        await asyncio.sleep(self.args.send_latency)
+        return {"ok": True}
+
+    def _discord_channel(self, request):
+        key = (request["channel"], request.get("dm", False))
+        if key not in self.channels:
+            channel_class = FakeDMChannel if request.get("dm") else FakeTextChannel
+            self.channels[key] = channel_class(len(self.channels) + 1, send_latency=self.args.send_latency)
+        return self.channels[key]
+
+    async def drive(self, request_id, request):
+        """Deliver one request to its bot and record how long handling took."""
+        start_time = time.perf_counter()
+        try:
+            if request.get("platform", "discord") == "discord":
+                message = fake_discord_message(
+                    request["text"], request["user"], self._discord_channel(request),
+                    bot_user=self.discord_bot.user, mention=request.get("mention", False),
+                )
+                await self.discord_bot.on_message(message)
+                platform = "discord"
+            else:
+                event = fake_slack_event(
+                    request["text"], request["user"], request["channel"],
+                    mention=request.get("mention", False), dm=request.get("dm", False),
+                )
+                task = await self.slack_bot._handle_message(event, self.slack_say)
+                if request.get("mention", False):
+                    # Slack also delivers a mention as a plain `message` event
+                    await self.slack_bot._handle_message({**event, "type": "message"}, self.slack_say)
+                if task is not None:
+                    await task
+                platform = "slack"
+            self.latencies[platform].append(time.perf_counter() - start_time)
+        except Exception as e:
+            self.errors += 1
+            self.logger.error(f"Request {request_id} ({request.get('platform', 'discord')}) failed.", exc_info=e)
+
+    async def replay(self, corpus, rate):
+        """Start one task per request at `rate` requests per second and wait for all of them."""
+        monitor = LoopLagMonitor()
+        monitor.start()
+        tasks = []
+        start_time = time.perf_counter()
+        for i, request in enumerate(corpus):
+            delay = start_time + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self.drive(i, request)))
+        await asyncio.gather(*tasks)
+        await self.memory.drain()
+        elapsed = time.perf_counter() - start_time
+        await monitor.stop()
+        return elapsed, monitor
+
+    def report(self, corpus, elapsed, monitor):
+        all_latencies = self.latencies["discord"] + self.latencies["slack"]
+        print(f"requests:      {len(corpus)} in {elapsed:.2f}s ({len(all_latencies) / elapsed:.1f} req/s completed)")
+        print(f"errors:        {self.errors}")
+        for platform, latencies in [("all", all_latencies), *self.latencies.items()]:
+            if latencies:
+                ms = [latency * 1000 for latency in latencies]
+                print(
+                    f"latency {platform:<7} p50={percentile(ms, 50):.0f}ms p95={percentile(ms, 95):.0f}ms "
+                    f"p99={percentile(ms, 99):.0f}ms max={max(ms):.0f}ms"
+                )
+        prompt_bytes = self.model.prompt_bytes
+        if prompt_bytes:
+            print(
+                f"model calls:   {len(prompt_bytes)} "
+                f"(prompt bytes mean={statistics.mean(prompt_bytes):.0f} p95={percentile(prompt_bytes, 95):.0f})"
+            )
+        print(f"loop lag:      {monitor.summary()}")
+        for (stage, platform), (count, total) in sorted(STAGE_SECONDS.snapshot().items()):
+            print(f"stage {stage:<18} {platform:<7} count={count} mean={total / count * 1000:.1f}ms")
+        print(f"scheduler:     {self.scheduler.stats()}")
+        print(f"single-flight: {self.gemini_service.single_flight.stats()}")
+        if self.answer_cache:
+            print(f"answer cache:  {self.answer_cache.stats()}")
+        print(f"memory:        {self.memory.stats()}")
+        print(f"relevance:     {self.relevance_gate.stats()}")
+        print(f"outbound:      discord={self.discord_bot.outbound.stats()} slack={self.slack_bot.outbound.stats()}")
+        for (platform,), (count, total) in sorted(DELIVERY_SECONDS.snapshot().items()):
+            print(f"delivery {platform:<7} count={count} mean={total / count * 1000:.1f}ms")
+        print(f"slack dedup:   {self.slack_bot.deduplicator.stats()}")
+        print(f"logging:       {Logger.stats()}")
+
+
+async def run(args):
+    corpus = load_corpus(args.corpus) if args.corpus else generate_corpus(args.generate, seed=args.seed)
+    if args.limit:
+        corpus = corpus[:args.limit]
+    if args.save_corpus:
+        with open(args.save_corpus, "w") as corpus_file:
+            corpus_file.writelines(json.dumps(request) + "\n" for request in corpus)
+
+    harness = Harness(args)
+    elapsed, monitor = await harness.replay(corpus, args.rate)
+    harness.report(corpus, elapsed, monitor)
+    harness.scheduler.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="JSONL corpus to replay (default: generate one).")
+    parser.add_argument("--generate", type=int, default=200, help="Number of requests to generate.")
+    parser.add_argument("--save-corpus", help="Write the replayed corpus to this JSONL file.")
+    parser.add_argument("--limit", type=int, help="Only replay the first N requests.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rate", type=float, default=20.0, help="Requests per second.")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake model time to first token (s).")
+    parser.add_argument("--output-tokens", type=int, default=300)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--send-latency", type=float, default=0.05, help="Fake platform send latency (s).")
+    parser.add_argument("--concurrency", type=int, default=8, help="Scheduler concurrency cap.")
+    parser.add_argument("--max-queue", type=int, default=100)
+    parser.add_argument("--user-rate", type=float, default=0.2, help="Scheduler requests per second per user.")
+    parser.add_argument("--channel-rate", type=float, default=1.0, help="Scheduler requests per second per channel.")
+    parser.add_argument("--memory-budget", type=int, default=2000, help="Conversation memory tokens per user.")
+    parser.add_argument("--relevance-mode", choices=["all", "questions", "mentions", "off"], default="questions",
+                        help="Relevance gate mode for the corpus channels ('all' answers everything).")
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--no-answer-cache", dest="answer_cache", action="store_false")
+    parser.add_argument("--retrieval-mode", choices=["retrieval", "full"], default="retrieval")
+    parser.add_argument("--doc-cache-dir", default=".cache/docs")
+    parser.add_argument("--pdf", default="docs/portone_docs.pdf")
+    parser.add_argument("--sitemap", default="sitemap.xml")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
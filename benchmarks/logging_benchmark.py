@@ -0,0 +1,77 @@
+"""Measure the event-loop cost of synchronous vs queued logging.
+
+Usage:
+    python -m benchmarks.logging_benchmark [--tasks 50] [--records 200] [--payload 5000] 2>/dev/null
+
+Concurrent tasks log Slack-event-sized payloads, once through a logger with the old
+synchronous console and rotating file handlers and once through `Logger.get_logger`,
+which only enqueues records for the background writer thread. Reports the per-call
+cost on the loop thread, loop lag and the queued logger's drop/rate-limit counters.
+Pass `--rate-limit` to keep the per-call-site rate limit (LOG_RATE_LIMIT) enabled.
+"""
+import argparse, asyncio, logging, os, tempfile, time
+from logging.handlers import RotatingFileHandler
+from benchmarks.loop_lag import LoopLagMonitor, percentile
+
+
+def synchronous_logger(log_file):
+    """Build a logger configured the way `Logger.get_logger` used to be."""
+    logger = logging.getLogger("benchmark.synchronous")
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    formatter = logging.Formatter("[%(asctime)s] [%(levelname)s] [%(name)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+    for handler in [logging.StreamHandler(), RotatingFileHandler(log_file, maxBytes=1024 * 1024, backupCount=2)]:
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+    return logger
+
+
+async def log_task(logger, records, event, costs):
+    for _ in range(records):
+        start_time = time.perf_counter()
+        logger.info("Message received: %s", event)
+        costs.append(time.perf_counter() - start_time)
+        await asyncio.sleep(0)
+
+
+async def measure(name, logger, args):
+    event = {"type": "message", "channel": "C123", "user": "U123", "text": "x" * args.payload}
+    costs = []
+    monitor = LoopLagMonitor()
+    monitor.start()
+    start_time = time.perf_counter()
+    await asyncio.gather(*(log_task(logger, args.records, event, costs) for _ in range(args.tasks)))
+    elapsed = time.perf_counter() - start_time
+    await monitor.stop()
+    us = [cost * 1e6 for cost in costs]
+    print(
+        f"[{name}] total={elapsed:.2f}s per call p50={percentile(us, 50):.1f}us "
+        f"p99={percentile(us, 99):.1f}us loop lag {monitor.summary()}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--records", type=int, default=200, help="Records logged per task.")
+    parser.add_argument("--payload", type=int, default=5000, help="Characters of message text per record.")
+    parser.add_argument("--rate-limit", action="store_true", help="Keep the hot-path rate limit enabled.")
+    args = parser.parse_args()
+
+    if not args.rate_limit:
+        os.environ["LOG_RATE_LIMIT"] = "0"
+    from utils.logging import Logger  # Reads the LOG_* settings on first use
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        asyncio.run(measure("synchronous", synchronous_logger(os.path.join(log_dir, "sync.log")), args))
+        queued = Logger.get_logger(
+            "benchmark.queued", log_level="DEBUG", log_file=os.path.join(log_dir, "queued.log"),
+            max_file_size=1024 * 1024, backup_count=2,
+        )
+        asyncio.run(measure("queued", queued, args))
+        print(f"[queued] {Logger.stats()}")
+        Logger.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import asyncio, statistics, time
+
+
+def percentile(values, percent):
+    """Return the nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))]
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up a periodic ticker task."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def summary(self):
+        lags_ms = [lag * 1000 for lag in self.lags] or [0.0]
+        return (
+            f"mean={statistics.mean(lags_ms):.2f}ms p99={percentile(lags_ms, 99):.2f}ms "
+            f"max={max(lags_ms):.2f}ms"
+        )
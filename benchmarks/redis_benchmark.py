@@ -0,0 +1,65 @@
+"""Measure the event-loop stall of blocking vs asyncio Redis history calls.
+
+Usage:
+    REDIS_URL=redis://localhost:6379/0 python -m benchmarks.redis_benchmark [--users 200] [--rounds 5]
+
+Each simulated user reads its history and appends a turn, once with the old
+blocking lrange/ltrim/rpush sequence on the loop thread and once with the
+pipelined asyncio RedisService, while a ticker task records loop lag.
+"""
+import argparse, asyncio, os, time
+import redis
+from dotenv import load_dotenv
+from benchmarks.loop_lag import LoopLagMonitor
+from utils.redis import RedisService
+
+
+async def blocking_user(client, user_id, rounds):
+    for round_num in range(rounds):
+        client.lrange(user_id, 0, -1)
+        client.ltrim(user_id, -5, -1)
+        client.rpush(user_id, f"User: question {round_num}", f"Bot: answer {round_num}")
+        await asyncio.sleep(0)
+
+
+async def async_user(service, user_id, rounds):
+    for round_num in range(rounds):
+        await service.get_user_history(user_id)
+        await service.add_to_user_history(user_id, f"question {round_num}", f"answer {round_num}")
+
+
+async def measure(name, users):
+    monitor = LoopLagMonitor()
+    monitor.start()
+    start_time = time.perf_counter()
+    await asyncio.gather(*users)
+    elapsed = time.perf_counter() - start_time
+    await monitor.stop()
+    print(f"[{name}] total={elapsed:.2f}s loop lag {monitor.summary()}")
+
+
+async def run(redis_url, users, rounds):
+    client = redis.StrictRedis.from_url(redis_url, decode_responses=True, socket_timeout=10)
+    user_ids = [f"benchmark:user:{i}" for i in range(users)]
+    await measure("blocking", [blocking_user(client, user_id, rounds) for user_id in user_ids])
+
+    service = RedisService(redis_url)
+    await service.ping()
+    await measure("asyncio", [async_user(service, user_id, rounds) for user_id in user_ids])
+
+    client.delete(*user_ids)
+    await service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    load_dotenv()
+    asyncio.run(run(os.getenv("REDIS_URL", "redis://localhost:6379/0"), args.users, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
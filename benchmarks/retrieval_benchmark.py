@@ -0,0 +1,68 @@
+"""Compare prompt size and end-to-end latency of full-context and retrieval prompts.
+
+Usage:
+    python -m benchmarks.retrieval_benchmark [--live] [--queries queries.txt]
+
+Prompt sizes are measured offline. With --live, each query is also sent to
+Gemini in both modes (requires GEMINI_API_KEY).
+"""
+import argparse, asyncio, os, statistics, time
+from dotenv import load_dotenv
+from utils.gemini import GeminiService
+from utils.retrieval import estimate_tokens
+
+DEFAULT_QUERIES = [
+    "How do I get my API keys?",
+    "How do I verify the webhook signature?",
+    "Which payment methods are supported in Vietnam?",
+    "How do I create a payment link from the dashboard?",
+    "How do I integrate the mobile SDK on Android?",
+    "What does the refund API return on failure?",
+]
+
+
+def _summary(values):
+    return f"mean={statistics.mean(values):.2f} min={min(values):.2f} max={max(values):.2f}"
+
+
+async def run(queries, live):
+    service = GeminiService(api_key=os.getenv("GEMINI_API_KEY", "benchmark"))
+    for mode in ("full", "retrieval"):
+        service.retrieval_mode = mode
+        service.rebuild_prompt_prefix()
+        sizes, tokens, build_ms, latencies = [], [], [], []
+        for query in queries:
+            start_time = time.perf_counter()
+            prompt = service.build_prompt(query)
+            build_ms.append((time.perf_counter() - start_time) * 1000)
+            sizes.append(len(prompt))
+            tokens.append(estimate_tokens(prompt))
+            if live:
+                start_time = time.perf_counter()
+                await service.generate_response(query)
+                latencies.append(time.perf_counter() - start_time)
+
+        print(f"[{mode}]")
+        print(f"  prompt chars:    {_summary(sizes)}")
+        print(f"  prompt tokens:   {_summary(tokens)}")
+        print(f"  prompt build ms: {_summary(build_ms)}")
+        if latencies:
+            print(f"  end-to-end s:    {_summary(latencies)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="Also call Gemini and measure end-to-end latency.")
+    parser.add_argument("--queries", help="File with one query per line.")
+    args = parser.parse_args()
+
+    load_dotenv()
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries) as query_file:
+            queries = [line.strip() for line in query_file if line.strip()]
+    asyncio.run(run(queries, args.live))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,41 @@
 import discord
 import redis
+from typing import TYPE_CHECKING
 from discord.ext import commands
 from utils.logging import Logger
-from utils.gemini import GeminiService
+from utils.memory import ConversationMemory
+from utils.metrics import EVENTS_TOTAL, stage
+from utils.outbound import OutboundSender
 from utils.redis import RedisService
+from utils.relevance import IGNORE, REPLY, RelevanceGate
+from utils.scheduler import OVERLOADED_MESSAGE, PRIORITY_AMBIENT, PRIORITY_DIRECT, SchedulerOverloaded
+from utils.startup import WARMING_UP_MESSAGE, NotReady
+from utils.streaming import ProgressiveSender
+from utils.tracing import new_trace
+
+if TYPE_CHECKING:
+    # Only for annotations; gateway processes never load the Gemini stack
+    from utils.gemini import GeminiService
 
 class DiscordBot(commands.Bot):
-    def __init__(self, redis_service: RedisService, gemini_service: GeminiService, command_prefix="!"):
+    def __init__(self, redis_service: RedisService, gemini_service: "GeminiService", command_prefix="!", streaming=False, stream_edit_interval=1.0,
+                 memory: ConversationMemory = None, reloader=None, relevance_gate: RelevanceGate = None,
+                 outbound: OutboundSender = None, **options):
         intents = discord.Intents.default()
         intents.message_content = True
 
-        super().__init__(command_prefix=command_prefix, intents=intents)
+        super().__init__(command_prefix=command_prefix, intents=intents, **options)
 
         self.redis_service = redis_service
         self.gemini_service = gemini_service
+        self.memory = memory or ConversationMemory(redis_service)
+        self.reloader = reloader
+        # Keep public-channel chatter away from the model
+        self.relevance_gate = relevance_gate or RelevanceGate(gemini_service)
+        # Discord allows about 5 messages per 5 seconds per channel
+        self.outbound = outbound or OutboundSender("discord", max_length=2000, rate=1.0, burst=5)
+        self.streaming = streaming
+        self.stream_edit_interval = stream_edit_interval
         self.logger = Logger.get_logger(name=__name__, log_level="DEBUG", log_file="logs/discord.log")
 
         # Register commands (note: now explicitly using a decorator or separate definitions)
@@ -32,9 +54,22 @@ class DiscordBot(commands.Bot):
         async def clear_history_command(ctx):
             """Clear user message history."""
             user_id = str(ctx.author.id)
-            self.redis_service.clear_history(user_id)
+            await self.memory.clear(user_id)
             await ctx.send("Your message history has been cleared.")
 
+        @self.command(name="reloaddocs")
+        @commands.is_owner()
+        async def reload_docs_command(ctx):
+            """Reload the documentation and sitemap (bot owner only)."""
+            if self.reloader is None:
+                await ctx.send("Document reloading is not enabled.")
+                return
+            corpus = await self.reloader.reload(force=True)
+            if corpus is None:
+                await ctx.send("Reloading the documentation failed; still serving the previous version.")
+            else:
+                await ctx.send(f"Documentation reloaded (corpus version {corpus.version}, {len(corpus.pages)} pages).")
+
     async def on_ready(self):
         self.logger.info(f"Bot is connected to the following servers:")
         for guild in self.guilds:
@@ -48,38 +83,107 @@ class DiscordBot(commands.Bot):
         if message.author == self.user:
             return
 
+        new_trace("discord")
+        EVENTS_TOTAL.inc(platform="discord")
+        if message.content.startswith(self.command_prefix):
+            return
+        is_dm = isinstance(message.channel, discord.DMChannel)
+        direct, addressed_elsewhere = self._addressing(message)
+        decision = self.relevance_gate.check(
+            message.content,
+            channel_id=None if is_dm else message.channel.id,
+            direct=is_dm or direct,
+            addressed_elsewhere=addressed_elsewhere,
+        )
+        if decision.action == IGNORE:
+            return
+        if decision.action == REPLY:
+            await self.send_response(message.channel, decision.reply)
+            return
+        with stage("request"):
+            await self.handle_message(message)
+
+    def _addressing(self, message):
+        """Return whether the message mentions or replies to the bot, and whether it is aimed at someone else."""
+        reference = getattr(message, "reference", None)
+        replied_to = getattr(getattr(reference, "resolved", None), "author", None)
+        direct = self.user in message.mentions or (replied_to is not None and replied_to == self.user)
+        elsewhere = any(user != self.user for user in message.mentions) or (replied_to is not None and replied_to != self.user)
+        return direct, elsewhere and not direct
+
+    async def handle_message(self, message):
+        """Answer a user message, in DMs with the user's history."""
+        user_id = str(message.author.id)
+
         # Handle DM responses
         if isinstance(message.channel, discord.DMChannel):
-            user_id = str(message.author.id)
-            user_history = self.redis_service.get_user_history(user_id) or []
+            with stage("history_fetch"):
+                user_history = await self.memory.get_history(user_id)
             user_history.append(f"User: {message.content}")
 
             try:
-                self.redis_service.trim_history(user_id)
                 async with message.channel.typing():
-                    bot_response = await self.gemini_service.generate_response(user_history)
-                    self.redis_service.add_to_user_history(user_id, message.content, bot_response)
-                    await self.send_response(message.channel, bot_response)
+                    bot_response = await self.respond(message.channel, user_history, user_id, PRIORITY_DIRECT)
+            except SchedulerOverloaded:
+                await message.channel.send(OVERLOADED_MESSAGE)
+                return
+            except NotReady:
+                await self.send_response(message.channel, WARMING_UP_MESSAGE)
+                return
             except Exception as e:
                 self.logger.error("Failed to generate response.", exc_info=e)
                 await message.channel.send("Sorry, I couldn't access your history. Please try again later.")
+                return
+
+            # The answer has been sent; a failed history write must not turn it into an error
+            try:
+                with stage("history_write"):
+                    await self.memory.add_exchange(user_id, message.content, bot_response)
+            except Exception as e:
+                self.logger.error("Failed to store the exchange in the user's history.", exc_info=e)
         else:
-            # Respond in public channels
-            async with message.channel.typing():
-                bot_response = await self.gemini_service.generate_response([message.content])
-                await self.send_response(message.channel, bot_response)
+            # Respond in public channels, serving mentions ahead of ambient chatter
+            priority = PRIORITY_DIRECT if self._addressing(message)[0] else PRIORITY_AMBIENT
+            try:
+                async with message.channel.typing():
+                    await self.respond(message.channel, [message.content], user_id, priority)
+            except SchedulerOverloaded:
+                await message.channel.send(OVERLOADED_MESSAGE)
+            except NotReady:
+                await self.send_response(message.channel, WARMING_UP_MESSAGE)
+
+    async def respond(self, channel, user_message, user_id=None, priority=PRIORITY_AMBIENT):
+        """Generate a response and send it to the channel, streaming it if enabled."""
+        request = {"user_id": user_id, "channel_id": str(channel.id), "priority": priority}
+        if self.streaming:
+            sender = ProgressiveSender(
+                post=channel.send,
+                edit=lambda sent_message, text: sent_message.edit(content=text),
+                max_length=2000,
+                edit_interval=self.stream_edit_interval,
+                logger=self.logger,
+            )
+            return await sender.send(self.gemini_service.stream_response(user_message, **request))
+
+        bot_response = await self.gemini_service.generate_response(user_message, **request)
+        with stage("send"):
+            await self.send_response(channel, bot_response)
+        return bot_response
 
     async def send_response(self, channel, bot_response):
-        """Helper function to send responses while handling Discord's message length limit."""
-        max_length = 2000
-        if len(bot_response) > max_length:
-            for i in range(0, len(bot_response), max_length):
-                await channel.send(bot_response[i:i + max_length])
-        else:
-            await channel.send(bot_response)
+        """Send a response through the channel's outbound queue, split to Discord's message length limit."""
+        await self.outbound.deliver(channel.id, bot_response, channel.send)
 
 
     async def close(self):
         """Clean up resources on bot shutdown."""
         self.logger.info("Closing the bot.")
         await super().close()  # Await the close coroutine
+
+
+class ShardedDiscordBot(DiscordBot, commands.AutoShardedBot):
+    """DiscordBot on several gateway shards, for large guild counts.
+
+    Pass `shard_count` and `shard_ids` to split the shards across gateway processes;
+    without them Discord's recommended shard count is used in this process.
+    """
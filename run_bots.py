@@ -1,10 +1,20 @@
-from discord_bot.discord_bot import DiscordBot
-from slack_bot.slack_bot import SlackBot
-from dotenv import load_dotenv
-import os, asyncio
-from utils.gemini import GeminiService
+import os, asyncio, signal
 from utils.logging import Logger
-from utils.redis import RedisService
+from utils.startup import Startup
+
+# Time every startup phase from here on, imports included
+startup = Startup()
+with startup.phase("imports"):
+    from discord_bot.discord_bot import DiscordBot, ShardedDiscordBot
+    from slack_bot.slack_bot import SlackBot
+    from dotenv import load_dotenv
+    from utils.bootstrap import build_job_queue
+    from utils.dedup import EventDeduplicator
+    from utils.memory import ConversationMemory
+    from utils.metrics import REGISTRY, MetricsServer
+    from utils.outbound import OutboundSender
+    from utils.redis import RedisService
+    from utils.relevance import RelevanceGate, parse_channel_modes
 
 # Configure the main logger
 logger = Logger.get_logger(
@@ -21,45 +31,149 @@ DISCORD_BOT_TOKEN = os.getenv("DISCORD_TOKEN")
 SLACK_APP_TOKEN = os.getenv("SLACK_APP_TOKEN")
 SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
 SLACK_SIGNING_SECRET = os.getenv("SLACK_SIGNING_SECRET")
+BOT_MODE = os.getenv("BOT_MODE", "standalone")
+STREAMING_ENABLED = os.getenv("STREAMING_ENABLED", "false").lower() == "true"
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "2000"))
+MEMORY_MAX_TURN_TOKENS = int(os.getenv("MEMORY_MAX_TURN_TOKENS", "500"))
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "300"))
+MEMORY_TTL = int(os.getenv("MEMORY_TTL", "604800"))
+RELEVANCE_MODE = os.getenv("RELEVANCE_MODE", "questions")
+RELEVANCE_CHANNEL_MODES = os.getenv("RELEVANCE_CHANNEL_MODES", "")
+RELEVANCE_MIN_DOC_OVERLAP = float(os.getenv("RELEVANCE_MIN_DOC_OVERLAP", "0.5"))
+DISCORD_SEND_RATE = float(os.getenv("DISCORD_SEND_RATE", "1.0"))
+DISCORD_SEND_BURST = int(os.getenv("DISCORD_SEND_BURST", "5"))
+SLACK_SEND_RATE = float(os.getenv("SLACK_SEND_RATE", "1.0"))
+SLACK_SEND_BURST = int(os.getenv("SLACK_SEND_BURST", "3"))
+SLACK_DEDUP_TTL = int(os.getenv("SLACK_DEDUP_TTL", "600"))
+JOB_RESULT_TIMEOUT = float(os.getenv("JOB_RESULT_TIMEOUT", "180"))
+DISCORD_SHARDED = os.getenv("DISCORD_SHARDED", "false").lower() == "true"
+DISCORD_SHARD_COUNT = int(os.getenv("DISCORD_SHARD_COUNT", "0")) or None
+DISCORD_SHARD_IDS = [int(shard_id) for shard_id in os.getenv("DISCORD_SHARD_IDS", "").split(",") if shard_id.strip()] or None
+
+if BOT_MODE not in ("standalone", "gateway"):
+    logger.error(f"Unknown BOT_MODE {BOT_MODE}, expected standalone or gateway.")
+    exit(1)
 
-if not REDIS_URL or not GEMINI_API_KEY or not SLACK_APP_TOKEN or not SLACK_BOT_TOKEN or not SLACK_SIGNING_SECRET or not DISCORD_BOT_TOKEN:
+if not REDIS_URL or (BOT_MODE == "standalone" and not GEMINI_API_KEY) or not SLACK_APP_TOKEN or not SLACK_BOT_TOKEN or not SLACK_SIGNING_SECRET or not DISCORD_BOT_TOKEN:
     logger.error("Missing environment variables. Please check your .env file.")
     exit(1)
 
 # Initialize the Redis service
 redis_service = RedisService(REDIS_URL)
-# Initialize the Gemini API service
-gemini_service = GeminiService(api_key=GEMINI_API_KEY)
-# Initialize the Discord bot
-discord_bot = DiscordBot(redis_service=redis_service, gemini_service=gemini_service)
+if BOT_MODE == "gateway":
+    # Answers are produced by `run_worker.py` processes that pull jobs from Redis
+    from utils.jobs import RemoteGeminiService
+    gemini_service = RemoteGeminiService(build_job_queue(redis_service), result_timeout=JOB_RESULT_TIMEOUT)
+    reloader = None
+    REGISTRY.register_stats("chatbot_jobs", gemini_service.stats)
+else:
+    # The documents are loaded in main() while the gateways connect
+    with startup.phase("gemini_stack"):
+        from utils.bootstrap import build_gemini_stack
+        gemini_service, reloader = build_gemini_stack(redis_service, GEMINI_API_KEY, load_documents=False)
+# Keep per-user conversations within a token budget, summarizing older turns
+memory = ConversationMemory(
+    redis_service,
+    summarizer=gemini_service.summarize,
+    token_budget=MEMORY_TOKEN_BUDGET,
+    max_turn_tokens=MEMORY_MAX_TURN_TOKENS,
+    summary_tokens=MEMORY_SUMMARY_TOKENS,
+    ttl=MEMORY_TTL,
+)
+# Export component statistics next to the request metrics
+REGISTRY.register_stats("chatbot_startup", startup.stats)
+REGISTRY.register_stats("chatbot_logging", Logger.stats)
+REGISTRY.register_stats("chatbot_memory", memory.stats)
+# Decide locally which channel messages are worth a model call
+relevance_gate = RelevanceGate(
+    gemini_service,
+    default_mode=RELEVANCE_MODE,
+    channel_modes=parse_channel_modes(RELEVANCE_CHANNEL_MODES),
+    min_doc_overlap=RELEVANCE_MIN_DOC_OVERLAP,
+)
+REGISTRY.register_stats("chatbot_relevance", relevance_gate.stats)
+# Pace and split outgoing messages per channel
+discord_outbound = OutboundSender("discord", max_length=2000, rate=DISCORD_SEND_RATE, burst=DISCORD_SEND_BURST)
+slack_outbound = OutboundSender("slack", max_length=4000, rate=SLACK_SEND_RATE, burst=SLACK_SEND_BURST)
+REGISTRY.register_stats("chatbot_outbound_discord", discord_outbound.stats)
+REGISTRY.register_stats("chatbot_outbound_slack", slack_outbound.stats)
+metrics_server = MetricsServer(port=METRICS_PORT) if METRICS_PORT else None
+# Initialize the Discord bot, optionally on several gateway shards
+discord_options = {"shard_count": DISCORD_SHARD_COUNT, "shard_ids": DISCORD_SHARD_IDS} if DISCORD_SHARDED else {}
+discord_bot = (ShardedDiscordBot if DISCORD_SHARDED else DiscordBot)(
+    redis_service=redis_service,
+    gemini_service=gemini_service,
+    memory=memory,
+    reloader=reloader,
+    relevance_gate=relevance_gate,
+    outbound=discord_outbound,
+    streaming=STREAMING_ENABLED,
+    stream_edit_interval=STREAM_EDIT_INTERVAL,
+    **discord_options,
+)
+# Handle each Slack message once, across redeliveries and replicas
+slack_deduplicator = EventDeduplicator(redis_service.client, ttl=SLACK_DEDUP_TTL, key_prefix="slack:event")
+REGISTRY.register_stats("chatbot_slack_dedup", slack_deduplicator.stats)
 # Initialize the Slack bot
 slack_bot = SlackBot(
     gemini_service=gemini_service,
     redis_service=redis_service,
     slack_bot_token=SLACK_BOT_TOKEN,
     slack_signing_secret=SLACK_SIGNING_SECRET,
+    memory=memory,
+    streaming=STREAMING_ENABLED,
+    stream_edit_interval=STREAM_EDIT_INTERVAL,
+    deduplicator=slack_deduplicator,
+    relevance_gate=relevance_gate,
+    outbound=slack_outbound,
 )
 
 # Function to start the Discord bot
 async def start_discord_bot():
     try:
-        await discord_bot.start(token=DISCORD_BOT_TOKEN)
+        await startup.run("discord_login", discord_bot.login(DISCORD_BOT_TOKEN))
+        startup.background(startup.run("discord_ready", discord_bot.wait_until_ready()))
+        await discord_bot.connect()
     except Exception as e:
         logger.error("Discord bot error", exc_info=e)
 
 # Function to start the Slack bot
 async def start_slack_bot():
     try:
-        await slack_bot.start()
+        await startup.run("slack_connect", slack_bot.connect())
         await slack_bot._set_presence("auto")
+        await asyncio.Event().wait()
     except Exception as e:
         logger.error("Slack bot error", exc_info=e)
 
+# Load the documents in a worker thread; until then questions get a warming-up reply
+async def load_documents():
+    if reloader is None:
+        startup.mark_ready()
+        return
+    corpus = await startup.run("documents", reloader.reload(force=True))
+    if corpus is None:
+        logger.error("Loading the documents failed; they are reloaded when the files change or on SIGHUP.")
+        return
+    startup.mark_ready()
+
 # Main function to run both bots concurrently
 async def main():
-    # Run both bots as separate tasks
+    steps = {"redis_ping": redis_service.ping()}
+    if metrics_server:
+        steps["metrics_server"] = metrics_server.start()
+    await startup.gather(**steps)
+    if reloader:
+        reloader.start()
+    # `kill -HUP <pid>` reloads the documentation
+    if reloader and hasattr(signal, "SIGHUP"):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reloader.request_reload)
+    # Run both bots as separate tasks, parsing the documents while they connect
     try:
         await asyncio.gather(
+            load_documents(),
             start_discord_bot(),
             start_slack_bot(),
         )
@@ -76,4 +190,7 @@ if __name__ == "__main__":
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         loop.run_until_complete(discord_bot.close())
+        if BOT_MODE == "gateway":
+            loop.run_until_complete(gemini_service.close())
+        loop.run_until_complete(redis_service.close())
         loop.close()
\ No newline at end of file
@@ -0,0 +1,76 @@
+import os, asyncio, signal
+from utils.logging import Logger
+from utils.startup import Startup
+
+# Time every startup phase from here on, imports included
+startup = Startup()
+with startup.phase("imports"):
+    from dotenv import load_dotenv
+    from utils.bootstrap import build_gemini_stack, build_job_queue
+    from utils.jobs import AnswerWorker
+    from utils.metrics import REGISTRY, MetricsServer
+    from utils.redis import RedisService
+
+# Configure the main logger
+logger = Logger.get_logger(
+    name=__name__,
+    log_level="DEBUG",
+    log_file="logs/worker.log"
+)
+
+# Load environment variables
+load_dotenv()
+REDIS_URL = os.getenv("REDIS_URL")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Separate from the gateway's METRICS_PORT so both can run on one host
+METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9101"))
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "16"))
+JOB_RESULT_TIMEOUT = float(os.getenv("JOB_RESULT_TIMEOUT", "180"))
+
+if not REDIS_URL or not GEMINI_API_KEY:
+    logger.error("Missing environment variables. Please check your .env file.")
+    exit(1)
+
+# Initialize the Redis service and the answer stack
+redis_service = RedisService(REDIS_URL)
+with startup.phase("gemini_stack"):
+    # The documents are loaded in main(), alongside the other startup steps
+    gemini_service, reloader = build_gemini_stack(redis_service, GEMINI_API_KEY, load_documents=False)
+# Jobs older than the gateways' timeout are dropped instead of answered
+worker = AnswerWorker(
+    build_job_queue(redis_service),
+    gemini_service,
+    concurrency=WORKER_CONCURRENCY,
+    job_ttl=JOB_RESULT_TIMEOUT,
+)
+REGISTRY.register_stats("chatbot_worker", worker.stats)
+REGISTRY.register_stats("chatbot_startup", startup.stats)
+REGISTRY.register_stats("chatbot_logging", Logger.stats)
+metrics_server = MetricsServer(port=METRICS_PORT) if METRICS_PORT else None
+
+# Main function to process answer jobs
+async def main():
+    steps = {"redis_ping": redis_service.ping(), "documents": reloader.reload(force=True)}
+    if metrics_server:
+        steps["metrics_server"] = metrics_server.start()
+    results = await startup.gather(**steps)
+    # Only take jobs once the documents are loaded, so other workers answer them meanwhile
+    if results["documents"] is None:
+        logger.error("Loading the documents failed, exiting without taking jobs.")
+        return
+    startup.mark_ready()
+    reloader.start()
+    # `kill -HUP <pid>` reloads the documentation
+    if hasattr(signal, "SIGHUP"):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reloader.request_reload)
+    await worker.run()
+
+# Entry point
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Worker stopped by user")
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(redis_service.close())
+        loop.close()
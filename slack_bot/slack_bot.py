@@ -1,21 +1,51 @@
-import os, re
+import asyncio, os, re
+from collections import OrderedDict
+from typing import TYPE_CHECKING
 from slack_bolt.async_app import AsyncApp
 from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
 from utils.logging import Logger
-from utils.gemini import GeminiService
-from utils.redis import RedisService
+from utils.dedup import EventDeduplicator
+from utils.memory import ConversationMemory
+from utils.metrics import DUPLICATE_EVENTS_TOTAL, EVENTS_TOTAL, stage
+from utils.outbound import OutboundSender
+from utils.redis import REDIS_ERRORS, RedisService
+from utils.relevance import IGNORE, MENTION_PATTERN, REPLY, RelevanceGate
+from utils.scheduler import OVERLOADED_MESSAGE, PRIORITY_AMBIENT, PRIORITY_DIRECT, SchedulerOverloaded
+from utils.startup import WARMING_UP_MESSAGE, NotReady
+from utils.streaming import ProgressiveSender
+from utils.tracing import new_trace
+
+if TYPE_CHECKING:
+    # Only for annotations; gateway processes never load the Gemini stack
+    from utils.gemini import GeminiService
+
+# Threads the bot has posted in, so follow-ups in them count as addressed to the bot
+BOT_THREADS_LOCAL = 10000
+BOT_THREAD_TTL = 7 * 24 * 3600
 
 class SlackBot:
     """A class to encapsulate Slack bot logic, message handling, and event management."""
 
-    def __init__(self, gemini_service: GeminiService, redis_service: RedisService, slack_bot_token, slack_signing_secret, logger=None, max_history=5):
+    def __init__(self, gemini_service: "GeminiService", redis_service: RedisService, slack_bot_token, slack_signing_secret, logger=None, memory: ConversationMemory = None,
+                 streaming=False, stream_edit_interval=1.0, deduplicator: EventDeduplicator = None,
+                 relevance_gate: RelevanceGate = None, outbound: OutboundSender = None):
         self.logger = logger or Logger.get_logger(
             name=__name__,
             log_level="DEBUG",
             log_file="logs/slack.log"
         )
         self.redis_service = redis_service
-        self.max_history = max_history
+        self.memory = memory or ConversationMemory(redis_service)
+        self.streaming = streaming
+        self.stream_edit_interval = stream_edit_interval
+        # A mention arrives as both `app_mention` and `message`, and Socket Mode redelivers slow acks
+        self.deduplicator = deduplicator or EventDeduplicator()
+        self._tasks = set()
+        self._bot_threads = OrderedDict()
+        # Keep public-channel chatter away from the model
+        self.relevance_gate = relevance_gate or RelevanceGate(gemini_service)
+        # Slack allows about one message per second per channel, with short bursts
+        self.outbound = outbound or OutboundSender("slack", max_length=4000, rate=1.0, burst=3)
 
         # Initialize Slack App
         self.app = AsyncApp(token=slack_bot_token, signing_secret=slack_signing_secret)
@@ -37,14 +67,69 @@ class SlackBot:
         self.app.event("app_mention")(self._mention_event_handler)
         self.app.message(re.compile(r".*"))(self._handle_message)
 
-    async def _mention_event_handler(self, event, say):
+    async def _mention_event_handler(self, event, say, body=None, context=None):
         """Handle @mention events in Slack."""
         self.logger.info("Bot mentioned in channel.")
-        await self._handle_message(event, say)
+        return await self._handle_message(event, say, body, context)
+
+    @staticmethod
+    def _event_key(event, body=None):
+        """Return a key shared by every delivery of the same Slack message."""
+        if event.get("channel") and event.get("ts"):
+            # Identical for the `app_mention` and `message` events of one message
+            return f"{event['channel']}:{event['ts']}"
+        return event.get("client_msg_id") or (body or {}).get("event_id")
+
+    async def _handle_message(self, event, say, body=None, context=None):
+        """Handle incoming Slack messages once, answering in the background so the event is acked right away.
+
+        Returns the task answering the message, or None for a duplicate or ignored message.
+        """
+        key = self._event_key(event, body)
+        if key and not await self.deduplicator.first_seen(key):
+            DUPLICATE_EVENTS_TOTAL.inc(platform="slack")
+            self.logger.debug("Dropped duplicate %s event %s.", event.get("type"), key)
+            return None
+        new_trace("slack")
+        EVENTS_TOTAL.inc(platform="slack")
+
+        # Whichever of the two events for a mention arrives first must still get mention priority
+        bot_user_id = (context or {}).get("bot_user_id")
+        text = event.get("text") or ""
+        mentioned = event.get("type") == "app_mention" or bool(bot_user_id and f"<@{bot_user_id}>" in text)
+        is_dm = event.get("channel_type") == "im"
+        replied_to_bot = bool(bot_user_id) and event.get("parent_user_id") == bot_user_id
+        if not (is_dm or mentioned or replied_to_bot):
+            # The bot answers in the asker's thread, so the thread root is usually theirs
+            replied_to_bot = await self._in_bot_thread(event)
+        mentions_others = any(mention != f"<@{bot_user_id}>" for mention in MENTION_PATTERN.findall(text))
+        decision = self.relevance_gate.check(
+            text,
+            channel_id=None if is_dm else event.get("channel"),
+            direct=is_dm or mentioned or replied_to_bot,
+            addressed_elsewhere=mentions_others and not mentioned,
+        )
+        if decision.action == IGNORE:
+            return None
+
+        task = asyncio.create_task(self._process_message(event, say, mentioned or replied_to_bot, decision))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
 
-    async def _handle_message(self, event, say):
-        """Handle incoming Slack messages."""
-        self.logger.info("Message received.", extra={"event": event})
+    async def _process_message(self, event, say, mentioned, decision):
+        """Answer a message that passed deduplication and the relevance gate."""
+        if decision.action == REPLY:
+            await self._send(say, decision.reply, event.get("channel"), event.get("thread_ts") or event.get("ts"))
+            return
+        with stage("request"):
+            await self._respond_to_message(event, say, mentioned)
+
+    async def _respond_to_message(self, event, say, mentioned=False):
+        """Answer a Slack message in its thread, using the user's history."""
+        self.logger.info(
+            "Message received: %s event in %s from %s.", event.get("type"), event.get("channel"), event.get("user")
+        )
 
         user_id = event.get("user")
         text = event.get("text")
@@ -56,41 +141,125 @@ class SlackBot:
             return  # Exit if necessary information is missing
 
         # Retrieve and update user message history
-        user_history = self.redis_service.get_user_history(user_id, max_length=self.max_history)
-        user_history.append(text)
-
+        with stage("history_fetch"):
+            user_history = await self.memory.get_history(user_id)
+        user_history.append(f"User: {text}")
 
         # Prepare context for response generation
-        message_history = " ".join(user_history)
+        message_history = user_history
+
+        # Serve DMs and mentions ahead of ambient channel chatter
+        is_direct = mentioned or event.get("channel_type") == "im"
+        request = {
+            "user_id": user_id,
+            "channel_id": channel,
+            "priority": PRIORITY_DIRECT if is_direct else PRIORITY_AMBIENT,
+        }
 
         try:
-            self.redis_service.trim_history(user_id, max_length=self.max_history)
+            if self.streaming:
+                bot_response = await self._stream_response(message_history, say, channel, thread_ts, request)
+                await self._store_exchange(user_id, text, bot_response)
+                return
+
             # Simulate typing by sending a typing indicator
-            await say(f"Typing...", channel=channel, thread_ts=thread_ts)
+            await self.outbound.indicate(
+                (channel, thread_ts), "Typing...", lambda text: say(text, channel=channel, thread_ts=thread_ts),
+                bucket=channel,
+            )
 
             # Fetch the bot response asynchronously
-            bot_response = await self.gemini_service.generate_response(message_history)
-
-            # Update Redis with the new message
-            self.redis_service.add_to_user_history(user_id, text, bot_response)
+            bot_response = await self.gemini_service.generate_response(message_history, **request)
 
-            # Add bot response to Redis
-            self.redis_service.add_to_user_history(user_id, text, bot_response)
+            # Store the exchange; older turns are summarized in the background
+            await self._store_exchange(user_id, text, bot_response)
 
-            # Split response to stay within Slack's character limit (4000 characters)
-            max_length = 4000
-            if len(bot_response) > max_length:
-                for i in range(0, len(bot_response), max_length):
-                    await say(bot_response[i:i + max_length], channel=channel, thread_ts=thread_ts)
-            else:
-                await say(bot_response, channel=channel, thread_ts=thread_ts)
+            with stage("send"):
+                await self._send(say, bot_response, channel, thread_ts)
 
+        except SchedulerOverloaded:
+            await self._send(say, OVERLOADED_MESSAGE, channel, thread_ts)
+        except NotReady:
+            await self._send(say, WARMING_UP_MESSAGE, channel, thread_ts)
         except Exception as e:
             self.logger.error("Error sending response to Slack.", exc_info=True, extra={"error": str(e)})
             await say("Sorry, I encountered an error while responding.", channel=channel)
 
-    async def start(self):
-        """Start the Slack bot using Socket Mode."""
+    async def _store_exchange(self, user_id, text, bot_response):
+        """Add the exchange to the user's history; a failure is logged and never reaches the user."""
+        try:
+            with stage("history_write"):
+                await self.memory.add_exchange(user_id, text, bot_response)
+        except Exception as e:
+            self.logger.error("Failed to store the exchange in the user's history.", exc_info=e)
+
+    @staticmethod
+    def _thread_key(channel, thread_ts):
+        return f"slack:bot_thread:{channel}:{thread_ts}"
+
+    async def _remember_thread(self, channel, thread_ts):
+        """Record that the bot posted in a thread, locally and in Redis for the other gateways."""
+        key = self._thread_key(channel, thread_ts)
+        if key in self._bot_threads:
+            self._bot_threads.move_to_end(key)
+            return
+        self._bot_threads[key] = None
+        if len(self._bot_threads) > BOT_THREADS_LOCAL:
+            self._bot_threads.popitem(last=False)
+        try:
+            await self.redis_service.client.set(key, 1, ex=BOT_THREAD_TTL)
+        except REDIS_ERRORS as e:
+            self.logger.error("Error recording a bot thread in Redis.", exc_info=e)
+
+    async def _in_bot_thread(self, event):
+        """Whether the event is a thread reply in a thread the bot has posted in."""
+        thread_ts = event.get("thread_ts")
+        if not thread_ts or thread_ts == event.get("ts"):
+            return False
+        key = self._thread_key(event.get("channel"), thread_ts)
+        if key in self._bot_threads:
+            return True
+        try:
+            return bool(await self.redis_service.client.exists(key))
+        except REDIS_ERRORS as e:
+            self.logger.error("Error looking up a bot thread in Redis.", exc_info=e)
+            return False
+
+    async def _send(self, say, text, channel, thread_ts):
+        """Send text through the thread's outbound queue, split to Slack's message length limit."""
+        await self._remember_thread(channel, thread_ts)
+        await self.outbound.deliver(
+            (channel, thread_ts), text, lambda chunk: say(chunk, channel=channel, thread_ts=thread_ts), bucket=channel
+        )
+
+    async def _stream_response(self, message_history, say, channel, thread_ts, request):
+        """Post the first part of the response right away and update it as Gemini streams the rest."""
+        await self._remember_thread(channel, thread_ts)
+
+        async def post(text):
+            response = await say(text, channel=channel, thread_ts=thread_ts)
+            return response["ts"]
+
+        async def edit(ts, text):
+            await self.app.client.chat_update(channel=channel, ts=ts, text=text)
+
+        sender = ProgressiveSender(
+            post=post,
+            edit=edit,
+            max_length=4000,
+            edit_interval=self.stream_edit_interval,
+            logger=self.logger,
+        )
+        return await sender.send(self.gemini_service.stream_response(message_history, **request))
+
+    async def connect(self):
+        """Open the Socket Mode connection; events are handled in the background from then on."""
         self.logger.info("Starting Slack bot...")
-        handler = AsyncSocketModeHandler(self.app, os.getenv("SLACK_APP_TOKEN"))
-        await handler.start_async()
\ No newline at end of file
+        self.socket_handler = AsyncSocketModeHandler(self.app, os.getenv("SLACK_APP_TOKEN"))
+        await self.socket_handler.connect_async()
+        self.logger.info("Slack bot connected.")
+
+    async def start(self):
+        """Start the Slack bot using Socket Mode and run until cancelled."""
+        await self.connect()
+        await asyncio.Event().wait()
\ No newline at end of file
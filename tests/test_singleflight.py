@@ -0,0 +1,88 @@
+import asyncio, unittest
+from utils.singleflight import SingleFlight
+
+
+class SingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_calls_share_one_execution(self):
+        single_flight = SingleFlight()
+        calls = 0
+
+        async def answer():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        results = await asyncio.gather(*(single_flight.do("key", answer) for _ in range(5)))
+        self.assertEqual(results, ["answer"] * 5)
+        self.assertEqual(calls, 1)
+
+    async def test_followers_answered_when_leader_is_cancelled(self):
+        single_flight = SingleFlight()
+        started = asyncio.Event()
+        calls = 0
+
+        async def answer():
+            nonlocal calls
+            calls += 1
+            started.set()
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        leader = asyncio.create_task(single_flight.do("key", answer))
+        await started.wait()
+        followers = [asyncio.create_task(single_flight.do("key", answer)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        self.assertEqual(await asyncio.gather(*followers), ["answer"] * 3)
+        self.assertTrue(leader.cancelled())
+        self.assertEqual(calls, 2)
+        self.assertEqual(single_flight.stats()["leader_cancellations"], 1)
+        self.assertEqual(single_flight.stats()["in_flight"], 0)
+
+    async def test_stream_followers_get_the_joined_text(self):
+        single_flight = SingleFlight()
+        calls = 0
+
+        async def deltas():
+            nonlocal calls
+            calls += 1
+            for delta in ("Hello", ", ", "world"):
+                await asyncio.sleep(0.01)
+                yield delta
+
+        async def collect():
+            return [delta async for delta in single_flight.stream("key", deltas)]
+
+        leader, follower, caller = await asyncio.gather(
+            collect(), collect(), single_flight.do("key", lambda: asyncio.sleep(0, "unused"))
+        )
+        self.assertEqual(leader, ["Hello", ", ", "world"])
+        self.assertEqual(follower, ["Hello, world"])
+        self.assertEqual(caller, "Hello, world")
+        self.assertEqual(calls, 1)
+
+    async def test_stream_followers_take_over_when_leader_stops(self):
+        single_flight = SingleFlight()
+        calls = 0
+
+        async def deltas():
+            nonlocal calls
+            calls += 1
+            for delta in ("a", "b"):
+                await asyncio.sleep(0.01)
+                yield delta
+
+        leader_stream = single_flight.stream("key", deltas)
+        self.assertEqual(await anext(leader_stream), "a")
+        follower = asyncio.create_task(single_flight.do("key", lambda: asyncio.sleep(0, "unused")))
+        await asyncio.sleep(0)
+        await leader_stream.aclose()
+
+        self.assertEqual(await follower, "unused")
+        self.assertEqual(calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
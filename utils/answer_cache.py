@@ -0,0 +1,260 @@
+import hashlib, json, re, time, unicodedata
+import numpy as np
+import redis
+from utils.logging import Logger
+
+MERSENNE_PRIME = (1 << 61) - 1
+# Bump when the signature scheme changes so entries with old signatures are not compared
+KEY_VERSION = 2
+# Words a paraphrase may add, drop or swap; every other word must match for a near-duplicate hit
+STOPWORDS = {
+    "a", "an", "the", "i", "me", "my", "we", "our", "you", "your", "it", "its", "is", "are", "am", "be", "do",
+    "does", "did", "can", "could", "should", "would", "will", "how", "what", "which", "where", "when", "why",
+    "to", "of", "in", "on", "for", "with", "from", "by", "at", "about", "there", "this", "that", "please",
+    "any", "some", "way", "possible", "know", "tell", "want", "need", "like", "hi", "hello", "hey", "thanks",
+}
+
+
+def normalize_query(text):
+    """Normalize a query so trivially different phrasings share a cache key."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def content_words(normalized):
+    """Return the words of a normalized query that carry its meaning."""
+    return frozenset(word for word in normalized.split() if word not in STOPWORDS)
+
+
+class MinHasher:
+    """Computes MinHash signatures over word unigrams and bigrams.
+
+    Word shingles keep one changed word (`enable`/`disable`) from looking like a small
+    edit, as it does with character shingles on a short question.
+    """
+
+    def __init__(self, num_perm=64, shingle_size=2, seed=1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        # Coefficients below 2**31 keep a * h + b inside uint64 for 32-bit shingle hashes
+        self.a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text):
+        words = text.split() or [""]
+        return {
+            " ".join(words[i:i + size])
+            for size in range(1, self.shingle_size + 1)
+            for i in range(len(words) - size + 1)
+        } or {text}
+
+    def signature(self, text):
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in self.shingles(text)),
+            dtype=np.uint64,
+        )
+        permuted = (np.outer(hashes, self.a) + self.b) % np.uint64(MERSENNE_PRIME)
+        return permuted.min(axis=0)
+
+    @staticmethod
+    def similarity(signature, other):
+        """Estimated Jaccard similarity of two signatures."""
+        return float(np.mean(signature == other))
+
+
+class _MinHashIndex:
+    """An in-process LSH index from MinHash signatures to cache keys."""
+
+    def __init__(self, bands):
+        self.bands = bands
+        self.buckets = {}
+        self.signatures = {}
+        self.terms = {}
+
+    def _band_keys(self, signature):
+        for band, values in enumerate(np.array_split(signature, self.bands)):
+            yield band, values.tobytes()
+
+    def add(self, key, signature, terms):
+        self.signatures[key] = signature
+        self.terms[key] = terms
+        for band_key in self._band_keys(signature):
+            self.buckets.setdefault(band_key, set()).add(key)
+
+    def remove(self, key):
+        signature = self.signatures.pop(key, None)
+        self.terms.pop(key, None)
+        if signature is None:
+            return
+        for band_key in self._band_keys(signature):
+            bucket = self.buckets.get(band_key)
+            if bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band_key]
+
+    def best_match(self, signature):
+        """Return (key, similarity) of the most similar indexed signature, or (None, 0.0)."""
+        candidates = set()
+        for band_key in self._band_keys(signature):
+            candidates |= self.buckets.get(band_key, set())
+        best_key, best_similarity = None, 0.0
+        for key in candidates:
+            similarity = MinHasher.similarity(signature, self.signatures[key])
+            if similarity > best_similarity:
+                best_key, best_similarity = key, similarity
+        return best_key, best_similarity
+
+
+class AnswerCache:
+    """A Redis-backed answer cache with exact and near-duplicate query matching."""
+
+    def __init__(self, redis_service, ttl=86400, max_entries=5000, similarity_threshold=0.9,
+                 num_perm=64, bands=16, logger=None):
+        self.logger = logger or Logger.get_logger(
+            name=__name__,
+            log_level="DEBUG",
+            log_file="logs/answer_cache.log"
+        )
+        self.client = redis_service.client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.minhasher = MinHasher(num_perm=num_perm)
+        self.bands = bands
+        self._version = None
+        self._index = None
+        self._stats = {
+            "exact_hits": 0,
+            "near_hits": 0,
+            "misses": 0,
+            "below_threshold": 0,
+            "content_mismatch": 0,
+            "stores": 0,
+            "evictions": 0,
+            "errors": 0,
+        }
+        # Best similarity seen on each lookup, bucketed by tenths
+        self._similarity_histogram = [0] * 10
+
+    def _namespace(self, version):
+        return f"answer_cache:v{KEY_VERSION}:{version}"
+
+    def _entry_key(self, version, query_hash):
+        return f"{self._namespace(version)}:entry:{query_hash}"
+
+    def _lru_key(self, version):
+        return f"{self._namespace(version)}:lru"
+
+    async def _index_for(self, version):
+        """Return the local LSH index for `version`, bootstrapping it from Redis on first use."""
+        if self._version == version:
+            return self._index
+
+        index = _MinHashIndex(self.bands)
+        query_hashes = await self.client.zrange(self._lru_key(version), 0, -1)
+        if query_hashes:
+            pipeline = self.client.pipeline(transaction=False)
+            for query_hash in query_hashes:
+                pipeline.hmget(self._entry_key(version, query_hash), "minhash", "query")
+            for query_hash, (minhash, query) in zip(query_hashes, await pipeline.execute()):
+                if minhash and query is not None:
+                    signature = np.asarray(json.loads(minhash), dtype=np.uint64)
+                    index.add(query_hash, signature, content_words(normalize_query(query)))
+        self.logger.info(f"Loaded {len(index.signatures)} cached answers for docs version {version}.")
+
+        self._version, self._index = version, index
+        return index
+
+    def _record_similarity(self, similarity):
+        self._similarity_histogram[min(int(similarity * 10), 9)] += 1
+
+    def _count(self, name):
+        self._stats[name] += 1
+
+    async def get(self, query, version):
+        """Return the cached answer for the query and docs version, or None."""
+        normalized = normalize_query(query)
+        query_hash = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        try:
+            answer = await self._touch(version, query_hash)
+            if answer is not None:
+                self._count("exact_hits")
+                return answer
+
+            index = await self._index_for(version)
+            match, similarity = index.best_match(self.minhasher.signature(normalized))
+            self._record_similarity(similarity)
+            if match is not None and similarity >= self.similarity_threshold \
+                    and index.terms[match] != content_words(normalized):
+                # Similar wording but a different subject or verb, e.g. enable/disable refunds
+                self._count("content_mismatch")
+            elif match is not None and similarity >= self.similarity_threshold:
+                answer = await self._touch(version, match)
+                if answer is not None:
+                    self._count("near_hits")
+                    self.logger.debug(f"Near-duplicate answer cache hit (similarity {similarity:.2f}).")
+                    return answer
+                # The entry expired in Redis; forget it locally
+                index.remove(match)
+            elif match is not None:
+                self._count("below_threshold")
+        except redis.RedisError as e:
+            self._count("errors")
+            self.logger.error("Error reading from the answer cache.", exc_info=e)
+
+        self._count("misses")
+        return None
+
+    async def _touch(self, version, query_hash):
+        """Fetch an entry's answer and mark it as recently used."""
+        answer = await self.client.hget(self._entry_key(version, query_hash), "answer")
+        if answer is not None:
+            await self.client.zadd(self._lru_key(version), {query_hash: time.time()})
+        return answer
+
+    async def set(self, query, version, answer):
+        """Cache an answer for the query and docs version, evicting the least recently used entries."""
+        normalized = normalize_query(query)
+        query_hash = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        signature = self.minhasher.signature(normalized)
+        entry_key = self._entry_key(version, query_hash)
+        lru_key = self._lru_key(version)
+        try:
+            index = await self._index_for(version)
+            pipeline = self.client.pipeline()
+            pipeline.hset(entry_key, mapping={
+                "query": query,
+                "answer": answer,
+                "minhash": json.dumps(signature.tolist()),
+            })
+            pipeline.expire(entry_key, self.ttl)
+            pipeline.zadd(lru_key, {query_hash: time.time()})
+            pipeline.expire(lru_key, self.ttl)
+            pipeline.zcard(lru_key)
+            size = (await pipeline.execute())[-1]
+            index.add(query_hash, signature, content_words(normalized))
+            self._count("stores")
+
+            if size > self.max_entries:
+                evicted = await self.client.zpopmin(lru_key, size - self.max_entries)
+                if evicted:
+                    await self.client.delete(*[self._entry_key(version, key) for key, _ in evicted])
+                    for key, _ in evicted:
+                        index.remove(key)
+                    self._stats["evictions"] += len(evicted)
+        except redis.RedisError as e:
+            self._count("errors")
+            self.logger.error("Error writing to the answer cache.", exc_info=e)
+
+    def stats(self):
+        """Return hit/miss counters and the histogram of best lookup similarities."""
+        stats = dict(self._stats)
+        stats["similarity_histogram"] = list(self._similarity_histogram)
+        stats["similarity_threshold"] = self.similarity_threshold
+        stats["indexed_entries"] = len(self._index.signatures) if self._index else 0
+        lookups = stats["exact_hits"] + stats["near_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["exact_hits"] + stats["near_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,83 @@
+"""Builds the answer stack (GeminiService with its caches, scheduler and reloader) from
+environment variables. Shared by `run_bots.py` in standalone mode and `run_worker.py`.
+
+The answer stack's modules (the Gemini SDK, NumPy, PyPDF2) are imported when it is built,
+so gateway processes that only need the job queue never load them. Modules the gateways
+do import take their tokenizer and token bucket from `utils.text` and `utils.rate_limit`,
+and `utils.scheduler` imports the Google client only once a Gemini call fails."""
+import os
+from utils.jobs import JobQueue
+from utils.metrics import REGISTRY
+
+
+def build_gemini_stack(redis_service, api_key, load_documents=True):
+    """Build the GeminiService and its document reloader, and export their statistics.
+
+    Without `load_documents` the service starts empty; load it with `reloader.reload(force=True)`.
+    """
+    from utils.answer_cache import AnswerCache
+    from utils.gemini import GeminiService
+    from utils.reloader import DocumentReloader
+    from utils.scheduler import GeminiScheduler
+    from utils.singleflight import SingleFlight
+
+    # Initialize the answer cache in front of the model
+    answer_cache = AnswerCache(
+        redis_service,
+        ttl=int(os.getenv("ANSWER_CACHE_TTL", "86400")),
+        max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000")),
+        similarity_threshold=float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.9")),
+    ) if os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true" else None
+    # Coalesce identical in-flight questions, optionally across replicas
+    single_flight = None
+    single_flight_mode = os.getenv("SINGLE_FLIGHT_MODE", "local")
+    if single_flight_mode == "local":
+        single_flight = SingleFlight()
+    elif single_flight_mode == "redis":
+        single_flight = SingleFlight(redis_client=redis_service.client)
+    # Bound and prioritize model calls
+    scheduler = GeminiScheduler(
+        max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+        max_queue=int(os.getenv("GEMINI_MAX_QUEUE", "100")),
+        user_rate=float(os.getenv("GEMINI_USER_RATE", "0.2")),
+        user_burst=int(os.getenv("GEMINI_USER_BURST", "3")),
+        channel_rate=float(os.getenv("GEMINI_CHANNEL_RATE", "1.0")),
+        channel_burst=int(os.getenv("GEMINI_CHANNEL_BURST", "10")),
+    )
+    # Initialize the Gemini API service
+    gemini_service = GeminiService(
+        api_key=api_key,
+        retrieval_mode=os.getenv("RETRIEVAL_MODE", "retrieval"),
+        retrieval_top_k=int(os.getenv("RETRIEVAL_TOP_K", "8")),
+        retrieval_token_budget=int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "3000")),
+        doc_cache_dir=os.getenv("DOC_CACHE_DIR", ".cache/docs"),
+        context_cache_mode=os.getenv("GEMINI_CONTEXT_CACHE", "off"),
+        context_cache_ttl=int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600")),
+        answer_cache=answer_cache,
+        single_flight=single_flight,
+        scheduler=scheduler,
+        sitemap_path=os.getenv("SITEMAP_PATH", "sitemap.xml"),
+        sitemap_top_k=int(os.getenv("SITEMAP_TOP_K", "5")),
+        load_documents=load_documents,
+    )
+    # Pick up documentation changes without restarting
+    reloader = DocumentReloader(gemini_service, poll_interval=float(os.getenv("DOCS_RELOAD_INTERVAL", "30")))
+
+    # Export component statistics next to the request metrics
+    REGISTRY.register_stats("chatbot_scheduler", scheduler.stats)
+    REGISTRY.register_stats("chatbot_docs", reloader.stats)
+    if single_flight:
+        REGISTRY.register_stats("chatbot_single_flight", single_flight.stats)
+    if answer_cache:
+        REGISTRY.register_stats("chatbot_answer_cache", answer_cache.stats)
+    return gemini_service, reloader
+
+
+def build_job_queue(redis_service):
+    """Build the Redis job queue shared by gateways and answer workers."""
+    return JobQueue(
+        redis_service.client,
+        max_length=int(os.getenv("JOB_QUEUE_MAX_LENGTH", "1000")),
+        max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+        claim_idle=float(os.getenv("JOB_CLAIM_IDLE", "300")),
+    )
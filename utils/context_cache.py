@@ -0,0 +1,183 @@
+import datetime, hashlib, threading, time
+from typing import NamedTuple
+import google.generativeai as genai
+from utils.logging import Logger
+from utils.retrieval import estimate_tokens
+
+# Gemini rejects cached content below this many tokens (gemini-1.5-flash)
+GEMINI_MIN_CACHE_TOKENS = 32768
+
+
+class PromptPrefix(NamedTuple):
+    """The static part of every prompt, assembled once per document load."""
+    text: str
+    digest: str
+    tokens: int
+
+    @classmethod
+    def build(cls, parts):
+        text = "\n".join(parts)
+        return cls(text, hashlib.sha256(text.encode("utf-8")).hexdigest(), estimate_tokens(text))
+
+
+class GeminiContextCache:
+    """Registers the prompt prefix with Gemini's cached-content API."""
+
+    def __init__(self, model_name, generation_config, safety_settings, min_tokens=GEMINI_MIN_CACHE_TOKENS):
+        self.model_name = model_name
+        self.min_tokens = min_tokens
+        self.generation_config = generation_config
+        self.safety_settings = safety_settings
+
+    def create(self, prefix, ttl):
+        """Upload the prefix and return (handle, model bound to it)."""
+        cached_content = genai.caching.CachedContent.create(
+            model=self.model_name,
+            display_name=f"docs-prefix-{prefix.digest[:12]}",
+            contents=[prefix.text],
+            ttl=datetime.timedelta(seconds=ttl),
+        )
+        model = genai.GenerativeModel.from_cached_content(
+            cached_content=cached_content,
+            generation_config=self.generation_config,
+            safety_settings=self.safety_settings,
+        )
+        return cached_content, model
+
+    def refresh(self, handle, ttl):
+        handle.update(ttl=datetime.timedelta(seconds=ttl))
+
+    def delete(self, handle):
+        handle.delete()
+
+
+class _PrefixedModel:
+    """Wraps a model so the prefix is prepended locally on every call."""
+
+    def __init__(self, model, prefix):
+        self.model = model
+        self.prefix = prefix
+
+    def generate_content(self, contents, **kwargs):
+        return self.model.generate_content(f"{self.prefix.text}\n{contents}", **kwargs)
+
+
+class LocalContextCache:
+    """A pluggable stand-in for GeminiContextCache that keeps the prefix in-process (for tests)."""
+
+    def __init__(self, model, min_tokens=0):
+        self.model = model
+        self.min_tokens = min_tokens
+        self.created = 0
+        self.refreshed = 0
+        self.deleted = 0
+
+    def create(self, prefix, ttl):
+        self.created += 1
+        return prefix.digest, _PrefixedModel(self.model, prefix)
+
+    def refresh(self, handle, ttl):
+        self.refreshed += 1
+
+    def delete(self, handle):
+        self.deleted += 1
+
+
+class ContextCacheManager:
+    """Keeps a cached-content entry for the current prompt prefix alive, refreshing its TTL.
+
+    Prefixes below the backend's `min_tokens` are never sent. A prefix whose creation
+    failed is not retried for `retry_backoff` seconds, doubling on each further failure
+    up to the TTL.
+    """
+
+    def __init__(self, backend, ttl=3600, refresh_margin=300, retry_backoff=60, logger=None):
+        self.logger = logger or Logger.get_logger(
+            name=__name__,
+            log_level="DEBUG",
+            log_file="logs/gemini.log"
+        )
+        if refresh_margin >= ttl:
+            raise ValueError("refresh_margin must be smaller than ttl.")
+        self.backend = backend
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.retry_backoff = retry_backoff
+        self._failures = {}  # digest -> (consecutive failures, retry after)
+        self._too_small = None
+        self._lock = threading.Lock()
+        self._digest = None
+        self._handle = None
+        self._model = None
+        self._expires_at = 0.0
+        self._stale = False
+
+    def get_model(self, prefix):
+        """Return a model bound to the cached prefix, or None if caching is unavailable.
+
+        Blocking: creation and TTL refresh call the backend, so run it off the event loop.
+        """
+        with self._lock:
+            now = time.time()
+            if self._stale or self._digest != prefix.digest:
+                # Delete the outdated entry first so it stops billing even if no new one is created
+                self._stale = False
+                self._delete_locked()
+                if prefix.tokens < getattr(self.backend, "min_tokens", 0):
+                    if self._too_small != prefix.digest:
+                        self._too_small = prefix.digest
+                        self.logger.info(
+                            f"Prompt prefix {prefix.digest[:12]} (~{prefix.tokens} tokens) is below the "
+                            f"{self.backend.min_tokens} token minimum for cached content, sending the full prompt."
+                        )
+                    return None
+                failures, retry_at = self._failures.get(prefix.digest, (0, 0.0))
+                if now < retry_at:
+                    return None
+                try:
+                    self._handle, self._model = self.backend.create(prefix, self.ttl)
+                except Exception as e:
+                    failures += 1
+                    backoff = min(self.retry_backoff * 2 ** (failures - 1), self.ttl)
+                    # Only the current prefix is worth retrying
+                    self._failures = {prefix.digest: (failures, now + backoff)}
+                    self.logger.error(
+                        f"Failed to create cached content, sending the full prompt; retrying in {backoff} seconds.",
+                        exc_info=e,
+                    )
+                    return None
+                self._failures.pop(prefix.digest, None)
+                self._digest = prefix.digest
+                self._expires_at = now + self.ttl
+                self.logger.info(f"Created cached content for prefix {prefix.digest[:12]} (~{prefix.tokens} tokens).")
+            elif self._expires_at - now < self.refresh_margin:
+                try:
+                    self.backend.refresh(self._handle, self.ttl)
+                    self._expires_at = now + self.ttl
+                    self.logger.debug("Refreshed cached content TTL.")
+                except Exception as e:
+                    # The entry may already have expired; recreate it on the next call
+                    self.logger.error("Failed to refresh cached content.", exc_info=e)
+                    self._digest = None
+                    return None
+            return self._model
+
+    def invalidate(self):
+        """Mark the cached prefix as stale, e.g. after the documents were reloaded.
+
+        Safe to call on the event loop: it neither takes the lock nor calls the backend.
+        The next `get_model` call deletes the old entry and creates a new one.
+        """
+        self._stale = True
+
+    def _delete_locked(self):
+        if self._handle is not None:
+            try:
+                self.backend.delete(self._handle)
+                self.logger.info(f"Deleted cached content for prefix {self._digest[:12]}.")
+            except Exception as e:
+                self.logger.error("Failed to delete cached content.", exc_info=e)
+        self._digest = None
+        self._handle = None
+        self._model = None
+        self._expires_at = 0.0
@@ -0,0 +1,53 @@
+from collections import OrderedDict
+from utils.logging import Logger
+from utils.redis import REDIS_ERRORS
+
+
+class EventDeduplicator:
+    """Remembers event keys so each event is handled once.
+
+    An in-process LRU catches duplicates cheaply; a Redis `SET NX` with a TTL catches
+    the ones delivered to another process or replica. Redis errors fail open, so an
+    outage can let a duplicate through but never drops a first delivery.
+    """
+
+    def __init__(self, redis_client=None, ttl=600, lru_size=10000, key_prefix="dedup", logger=None):
+        self.logger = logger or Logger.get_logger(
+            name=__name__,
+            log_level="DEBUG",
+            log_file="logs/dedup.log"
+        )
+        self.client = redis_client
+        self.ttl = ttl
+        self.lru_size = lru_size
+        self.key_prefix = key_prefix
+        self._recent = OrderedDict()
+        self._stats = {"events": 0, "duplicates_local": 0, "duplicates_remote": 0, "errors": 0}
+
+    async def first_seen(self, key):
+        """Record `key` and return True unless it was already seen; duplicates return False."""
+        self._stats["events"] += 1
+        if key in self._recent:
+            self._recent.move_to_end(key)
+            self._stats["duplicates_local"] += 1
+            return False
+        self._recent[key] = None
+        if len(self._recent) > self.lru_size:
+            self._recent.popitem(last=False)
+
+        if self.client is None:
+            return True
+        try:
+            claimed = await self.client.set(f"{self.key_prefix}:{key}", 1, nx=True, ex=self.ttl)
+        except REDIS_ERRORS as e:
+            self._stats["errors"] += 1
+            self.logger.error("Error checking event key in Redis, handling the event.", exc_info=e)
+            return True
+        if not claimed:
+            self._stats["duplicates_remote"] += 1
+            return False
+        return True
+
+    def stats(self):
+        """Return event and suppressed duplicate counters."""
+        return dict(self._stats)
@@ -0,0 +1,178 @@
+"""On-disk cache of extracted PDF pages and the derived retrieval index.
+
+Entries live in ``<cache_dir>/<pdf sha256>-v<parser version>/`` so a changed
+PDF or parser automatically misses. Strings are stored as UTF-8 blobs with
+NumPy offset arrays and index arrays as ``.npy`` files, which are loaded
+memory-mapped. Prebuild the cache (e.g. during ``docker build``) with:
+
+    python -m utils.doc_cache docs/portone_docs.pdf
+"""
+import argparse, json, os, shutil, sys, tempfile, time
+import numpy as np
+from utils.documents import PARSER_VERSION, extract_pdf_pages, file_sha256, normalize_pages
+from utils.logging import Logger
+from utils.retrieval import DocumentIndex
+
+INDEX_ARRAYS = ("chunk_pages", "indptr", "indices", "weights")
+
+
+def _write_strings(directory, name, strings):
+    """Write strings as one UTF-8 blob plus an offsets array."""
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(data) for data in encoded], out=offsets[1:])
+    with open(os.path.join(directory, f"{name}.bin"), 'wb') as blob:
+        blob.write(b"".join(encoded))
+    np.save(os.path.join(directory, f"{name}.offsets.npy"), offsets)
+
+
+def _read_strings(directory, name):
+    """Read strings written by _write_strings."""
+    offsets = np.load(os.path.join(directory, f"{name}.offsets.npy"), mmap_mode="r")
+    with open(os.path.join(directory, f"{name}.bin"), 'rb') as blob:
+        data = blob.read()
+    return [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+class DocumentCache:
+    """A persistent cache of parsed documents keyed by content hash and parser version."""
+
+    def __init__(self, cache_dir, logger=None):
+        self.logger = logger or Logger.get_logger(
+            name=__name__,
+            log_level="DEBUG",
+            log_file="logs/doc_cache.log"
+        )
+        self.cache_dir = cache_dir
+
+    def entry_path(self, pdf_hash):
+        return os.path.join(self.cache_dir, f"{pdf_hash}-v{PARSER_VERSION}")
+
+    def load(self, pdf_hash, index):
+        """Return the cached pages and page hashes and restore the index into `index`, or None on a miss."""
+        path = self.entry_path(pdf_hash)
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            self.logger.info(f"Document cache miss for {pdf_hash[:12]}.")
+            return None
+        try:
+            with open(meta_path) as meta_file:
+                meta = json.load(meta_file)
+            if meta.get("index_params") != index.params():
+                self.logger.info("Document cache entry was built with different index parameters.")
+                return None
+
+            page_numbers = np.load(os.path.join(path, "page_numbers.npy"))
+            pages = dict(zip(page_numbers.tolist(), _read_strings(path, "pages")))
+            # Entries written before page hashes were stored just miss incremental reuse
+            has_hashes = os.path.exists(os.path.join(path, "page_hashes.bin"))
+            page_hashes = dict(zip(page_numbers.tolist(), _read_strings(path, "page_hashes"))) if has_hashes else {}
+            state = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in INDEX_ARRAYS}
+            state["chunk_texts"] = _read_strings(path, "chunks")
+            state["vocabulary"] = _read_strings(path, "vocabulary")
+            index.set_state(state)
+        except (OSError, ValueError, KeyError) as e:
+            self.logger.error("Failed to read document cache entry, ignoring it.", exc_info=e)
+            return None
+
+        self.logger.info(f"Document cache hit for {pdf_hash[:12]} ({len(pages)} pages).")
+        return pages, page_hashes
+
+    def save(self, pdf_hash, pages, page_hashes, index, source=None):
+        """Atomically write a cache entry and remove stale ones for the same `source` PDF path."""
+        source = os.path.abspath(source) if source else None
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(prefix=".tmp-", dir=self.cache_dir)
+        try:
+            page_numbers = sorted(pages)
+            np.save(os.path.join(tmp_path, "page_numbers.npy"), np.asarray(page_numbers, dtype=np.int32))
+            _write_strings(tmp_path, "pages", [pages[page_num] or "" for page_num in page_numbers])
+            _write_strings(tmp_path, "page_hashes", [page_hashes[page_num] for page_num in page_numbers])
+
+            state = index.get_state()
+            for name in INDEX_ARRAYS:
+                np.save(os.path.join(tmp_path, f"{name}.npy"), np.asarray(state[name]))
+            _write_strings(tmp_path, "chunks", state["chunk_texts"])
+            _write_strings(tmp_path, "vocabulary", state["vocabulary"])
+
+            with open(os.path.join(tmp_path, "meta.json"), 'w') as meta_file:
+                json.dump({
+                    "pdf_sha256": pdf_hash,
+                    "source": source,
+                    "parser_version": PARSER_VERSION,
+                    "index_params": index.params(),
+                    "created_at": time.time(),
+                }, meta_file)
+
+            path = self.entry_path(pdf_hash)
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+        self.prune(keep=os.path.basename(path), source=source)
+        self.logger.info(f"Saved document cache entry {os.path.basename(path)}.")
+
+    def prune(self, keep, source=None):
+        """Remove entries built by an older parser version, and other versions of the `source` PDF.
+
+        Entries for other PDFs sharing the directory are kept.
+        """
+        for entry in os.listdir(self.cache_dir):
+            if entry == keep or entry.startswith(".tmp-"):
+                continue
+            path = os.path.join(self.cache_dir, entry)
+            if not entry.endswith(f"-v{PARSER_VERSION}"):
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            try:
+                with open(os.path.join(path, "meta.json")) as meta_file:
+                    entry_source = json.load(meta_file).get("source")
+            except (OSError, ValueError):
+                continue
+            if source and entry_source == source:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+def load_or_build(pdf_path, index, cache=None, logger=None, known_pages=None):
+    """Return the PDF pages, their hash and per-page hashes, reading them and `index` from the cache when possible.
+
+    `known_pages` ({page content hash: text}) lets unchanged pages skip re-extraction.
+    """
+    pdf_hash = file_sha256(pdf_path)
+    if cache:
+        cached = cache.load(pdf_hash, index)
+        if cached is not None:
+            pages, page_hashes = cached
+            return pages, pdf_hash, page_hashes
+
+    pages, page_hashes = extract_pdf_pages(pdf_path, known_pages)
+    if known_pages and logger:
+        reused = sum(page_hash in known_pages for page_hash in page_hashes.values())
+        logger.info(f"Reused {reused} unchanged pages, extracted {len(pages) - reused}.")
+    # Pages are kept as extracted so unchanged ones can be reused; the index sees the normalized text
+    index.build(normalize_pages(pages))
+    if cache:
+        try:
+            cache.save(pdf_hash, pages, page_hashes, index, source=pdf_path)
+        except OSError as e:
+            (logger or cache.logger).error("Failed to write document cache entry.", exc_info=e)
+    return pages, pdf_hash, page_hashes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prebuild the parsed document cache.")
+    parser.add_argument("pdf_path", nargs="?", default="docs/portone_docs.pdf")
+    parser.add_argument("--cache-dir", default=os.getenv("DOC_CACHE_DIR") or ".cache/docs")
+    args = parser.parse_args()
+
+    cache = DocumentCache(args.cache_dir)
+    start_time = time.time()
+    pages, _, _ = load_or_build(args.pdf_path, DocumentIndex(), cache)
+    cache.logger.info(f"Document cache for {args.pdf_path} ready ({len(pages)} pages) in {time.time() - start_time:.2f} seconds.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+import hashlib, math, re, PyPDF2
+from collections import Counter
+
+# Bump whenever page extraction, page hashing or normalization changes so cached documents are re-parsed
+PARSER_VERSION = 3
+
+# Running headers and footers are looked for among the first and last lines of each page
+BOILERPLATE_EDGE_LINES = 3
+BOILERPLATE_MAX_CHARS = 200
+CODE_FENCE = "```"
+CODE_LINE = re.compile(
+    r"^\s{2,}\S"                    # indented
+    r"|[{};]\s*$"                   # ends a statement or opens/closes a block
+    r"|^\s*(\$ |>>> |curl |import |from \S+ import |def |class |const |let |var |function |return |//|<\w+[^>]*>)"
+    r"|^\s*[\w.]+\(.*\)\s*;?\s*$"   # a bare call
+    r"|^\s*\"[\w-]+\"\s*:"          # a JSON member
+)
+INVISIBLE_CHARACTERS = dict.fromkeys(map(ord, "\u200b\u200c\u200d\ufeff\x00"))
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Return the hex SHA-256 digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _object_digest(obj, digest, memo, path=()):
+    """Feed a PDF object into `digest`, following indirect references and including stream data.
+
+    `memo` caches the digests of indirect objects, so resources shared by many pages
+    (fonts, Form XObjects) are hashed once per file. `path` guards against reference cycles.
+    """
+    if isinstance(obj, PyPDF2.generic.IndirectObject):
+        key = (obj.idnum, obj.generation)
+        if key in path:
+            digest.update(b"<cycle>")
+            return
+        if key not in memo:
+            inner = hashlib.sha256()
+            _object_digest(obj.get_object(), inner, memo, path + (key,))
+            memo[key] = inner.digest()
+        digest.update(memo[key])
+    elif isinstance(obj, PyPDF2.generic.DictionaryObject):
+        digest.update(b"<<")
+        for name in sorted(obj):
+            # /Parent points back up the page tree and would make every page depend on all the others
+            if name in ("/Parent", "/P"):
+                continue
+            digest.update(str(name).encode())
+            _object_digest(obj.raw_get(name), digest, memo, path)
+        digest.update(b">>")
+        if isinstance(obj, PyPDF2.generic.StreamObject):
+            digest.update(obj.get_data())
+    elif isinstance(obj, PyPDF2.generic.ArrayObject):
+        digest.update(b"[")
+        for item in obj:
+            _object_digest(item, digest, memo, path)
+        digest.update(b"]")
+    else:
+        digest.update(repr(obj).encode())
+
+
+def page_sha256(page, memo=None):
+    """Return the hex SHA-256 digest of a PDF page's content stream and the resources it draws with.
+
+    Resources matter: pages that only say `/Fm0 Do` have identical content streams but
+    show whatever their Form XObject contains.
+    """
+    memo = {} if memo is None else memo
+    digest = hashlib.sha256()
+    contents = page.get_contents()
+    digest.update(contents.get_data() if contents is not None else b"")
+    _object_digest(page.get("/Resources"), digest, memo)
+    return digest.hexdigest()
+
+
+def extract_pdf_pages(pdf_path, known_pages=None):
+    """Extract the text of every PDF page.
+
+    Returns {page_number: text} and {page_number: content hash}. Pages whose content hash
+    is in `known_pages` ({content hash: text}, e.g. from the previous load) are not re-extracted.
+    """
+    known_pages = known_pages or {}
+    with open(pdf_path, 'rb') as pdf_file:
+        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        page_dict, page_hashes, memo = {}, {}, {}
+        for page_num, page in enumerate(pdf_reader.pages, start=1):  # Page numbers start from 1
+            page_hash = page_sha256(page, memo)
+            page_dict[page_num] = known_pages[page_hash] if page_hash in known_pages else page.extract_text()
+            page_hashes[page_num] = page_hash
+        return page_dict, page_hashes
+
+
+def _line_signature(line, page_num):
+    """Normalize a line for boilerplate matching; the page number is masked so `Page 3` matches `Page 4`."""
+    return re.sub(rf"\b{page_num}\b", "#", " ".join(line.split())).lower()
+
+
+def _edge_lines(lines):
+    """Return the indices of the first and last few non-blank lines."""
+    non_blank = [i for i, line in enumerate(lines) if line.strip()]
+    return set(non_blank[:BOILERPLATE_EDGE_LINES] + non_blank[-BOILERPLATE_EDGE_LINES:])
+
+
+def find_boilerplate(pages, min_share=0.5):
+    """Return the signatures of header and footer lines repeated on at least `min_share` of the pages (and 3)."""
+    counts = Counter()
+    for page_num, text in pages.items():
+        lines = (text or "").splitlines()
+        counts.update({
+            _line_signature(lines[i], page_num) for i in _edge_lines(lines) if len(lines[i]) <= BOILERPLATE_MAX_CHARS
+        })
+    threshold = max(3, math.ceil(min_share * len(pages)))
+    return {signature for signature, count in counts.items() if count >= threshold}
+
+
+def normalize_page(text, page_num=None, boilerplate=()):
+    """Drop boilerplate lines and collapse whitespace in prose, keeping code lines and fenced blocks verbatim."""
+    lines = (text or "").translate(INVISIBLE_CHARACTERS).splitlines()
+    edges = _edge_lines(lines) if boilerplate else ()
+    normalized, in_fence = [], False
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped.startswith(CODE_FENCE):
+            in_fence = not in_fence
+            normalized.append(stripped)
+        elif in_fence or CODE_LINE.search(line):
+            normalized.append(line.rstrip().expandtabs(4))
+        elif i in edges and _line_signature(line, page_num) in boilerplate:
+            continue
+        elif stripped:
+            normalized.append(" ".join(stripped.split()))
+        elif normalized and normalized[-1]:
+            # Keep paragraph breaks, but only one blank line
+            normalized.append("")
+    return "\n".join(normalized).strip("\n")
+
+
+def normalize_pages(pages):
+    """Normalize every page, stripping the headers and footers repeated across pages."""
+    boilerplate = find_boilerplate(pages)
+    return {page_num: normalize_page(text, page_num, boilerplate) for page_num, text in pages.items()}
+
+
+def format_pages(pages):
+    """Render pages as compact page-tagged plain text for the prompt, skipping empty and repeated pages."""
+    seen, parts = set(), []
+    for page_num, text in sorted(pages.items()):
+        if not text or text in seen:
+            continue
+        seen.add(text)
+        parts.append(f"[Page {page_num}]\n{text}")
+    return "\n\n".join(parts)
+
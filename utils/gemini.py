@@ -1,23 +1,101 @@
-import os, time, PyPDF2, asyncio
+import os, time, asyncio, hashlib, contextlib, itertools
+from typing import NamedTuple
 import google.generativeai as genai
 from dotenv import load_dotenv
 from google.generativeai.types import HarmCategory, HarmBlockThreshold, GenerationConfig
 import xml.etree.ElementTree as ET
+from utils.context_cache import ContextCacheManager, GeminiContextCache, LocalContextCache, PromptPrefix
+from utils.answer_cache import normalize_query
+from utils.doc_cache import DocumentCache, load_or_build
+from utils.documents import format_pages, normalize_pages
 from utils.logging import Logger
+from utils.metrics import PROMPT_CHARS, observe_stage, stage
+from utils.tracing import platform_var
+from utils.retrieval import DocumentIndex, estimate_tokens
+from utils.scheduler import PRIORITY_AMBIENT, PRIORITY_BACKGROUND
+from utils.sitemap import SitemapIndex, iter_sitemap_urls
+from utils.startup import NotReady
+
+PROMPT_PREAMBLE = '''
+            Below are documents from XYZ, a financial services company offering payment aggregation services through API, dashboard, and mobile SDK solutions for businesses.
+            Base link for the documentation: https://xyz.com. In this documentation, ✅ indicates the correct information, and ❌ indicates incorrect information.
+            '''
+
+PROMPT_INSTRUCTIONS = '''
+            You are a super helpful customer support representative bot on Discord and Slack for PortOne.
+            Be friendly and fun to talk to, and provide helpful information to users who reach out to you.
+            Also, provide code snippets or links to the documentation when necessary. Do not give invalid links or code snippets.
+            Adhere strictly to the content provided in the documentation, and do not provide any information that is not present in the documentation.
+            '''
+
+PROMPT_QUERY_INTRO = "A user has reached out with the following query:"
+
+SUMMARY_INSTRUCTIONS = '''
+            Summarize the following conversation between a user and the PortOne support bot in at most {max_words} words.
+            Keep the user's questions, the facts and links the bot gave, and anything the user said about their setup.
+            '''
+
+MODEL_NAME = "gemini-1.5-flash"
+# Cached content requires an explicit model version
+CACHED_MODEL_NAME = "models/gemini-1.5-flash-002"
+
+
+class Corpus(NamedTuple):
+    """An immutable snapshot of the loaded documents and everything derived from them.
+
+    Reloads build a new snapshot and swap it in; requests keep the snapshot they started with.
+    """
+    version: int
+    pdf_hash: str
+    pages: dict
+    page_hashes: dict
+    pdf_context: str
+    doc_index: DocumentIndex
+    sitemap_links: str
+    sitemap_index: SitemapIndex
+    prompt_prefix: PromptPrefix
+    docs_version: str
+
 
 class GeminiService:
     """A class to encapsulate Gemini API functionality, PDF processing, and sitemap handling."""
 
-    def __init__(self, api_key, logger=None):
+    def __init__(self, api_key, logger=None, retrieval_mode="retrieval", retrieval_top_k=8, retrieval_token_budget=3000, doc_cache_dir=None,
+                 context_cache_mode="off", context_cache_ttl=3600, answer_cache=None,
+                 single_flight=None, scheduler=None, pdf_path="docs/portone_docs.pdf", sitemap_path="sitemap.xml",
+                 sitemap_top_k=5, load_documents=True):
         self.logger = logger or Logger.get_logger(
             name=__name__,
             log_level="DEBUG",
             log_file="logs/gemini.log"
         )
+        if retrieval_mode not in ("retrieval", "full"):
+            raise ValueError(f"Unknown retrieval mode: {retrieval_mode}")
+        if context_cache_mode not in ("off", "gemini", "local"):
+            raise ValueError(f"Unknown context cache mode: {context_cache_mode}")
         self.api_key = api_key
+        self.retrieval_mode = retrieval_mode
+        self.retrieval_top_k = retrieval_top_k
+        self.retrieval_token_budget = retrieval_token_budget
+        self.sitemap_top_k = sitemap_top_k
+        self.doc_cache = DocumentCache(doc_cache_dir, logger=self.logger) if doc_cache_dir else None
+        self.pdf_path = pdf_path
+        self.sitemap_path = sitemap_path
+        self.corpus = None
+        self._corpus_versions = itertools.count(1)
+        self.answer_cache = answer_cache
+        self.single_flight = single_flight
+        self.scheduler = scheduler
         self._configure_genai()
-        self.load_pdf_context("docs/portone_docs.pdf")
-        self.load_sitemap_links("sitemap.xml")
+        self.context_cache = self._create_context_cache(context_cache_mode, context_cache_ttl)
+        # Without `load_documents`, questions raise NotReady until reload_documents(_async) has run
+        if load_documents:
+            self.reload_documents()
+
+    @property
+    def ready(self):
+        """Whether the documents have been loaded and questions can be answered."""
+        return self.corpus is not None
 
     def _configure_genai(self):
         """Configure the Generative AI model and settings."""
@@ -37,87 +115,328 @@ class GeminiService:
         }
 
         self.model_flash = genai.GenerativeModel(
-            model_name="gemini-1.5-flash",
+            model_name=MODEL_NAME,
             generation_config=self.generation_config,
             safety_settings=self.safety_settings,
         )
 
-    def load_pdf_context(self, pdf_path):
-        """Load PDF content and cache it as a dictionary string."""
+    def _create_context_cache(self, mode, ttl):
+        """Create the provider-side (or local stand-in) prompt prefix cache."""
+        if mode == "off":
+            return None
+        if mode == "gemini":
+            backend = GeminiContextCache(CACHED_MODEL_NAME, self.generation_config, self.safety_settings)
+        else:
+            backend = LocalContextCache(self.model_flash)
+        self.logger.info(f"Using {mode} context cache with a TTL of {ttl} seconds.")
+        return ContextCacheManager(backend, ttl=ttl, refresh_margin=min(300, ttl // 2), logger=self.logger)
+
+    def reload_documents(self, pdf_path=None, sitemap_path=None):
+        """(Re)load the PDF and sitemap and swap in the new corpus. Blocking."""
+        return self._install_corpus(self.build_corpus(pdf_path, sitemap_path, self.corpus))
+
+    async def reload_documents_async(self, pdf_path=None, sitemap_path=None):
+        """Rebuild the corpus in a worker thread and swap it in; in-flight requests keep the old one."""
+        corpus = await asyncio.to_thread(self.build_corpus, pdf_path, sitemap_path, self.corpus)
+        return self._install_corpus(corpus)
+
+    def build_corpus(self, pdf_path=None, sitemap_path=None, previous=None):
+        """Parse the documents into a new corpus, re-extracting only pages that changed since `previous`.
+
+        Does not touch the current corpus, so it is safe to run in a worker thread.
+        """
+        pdf_path = pdf_path or self.pdf_path
+        sitemap_path = sitemap_path or self.sitemap_path
+        known_pages = {
+            page_hash: previous.pages[page_num] for page_num, page_hash in previous.page_hashes.items()
+        } if previous else None
+        doc_index = DocumentIndex()
+        pages, pdf_hash, page_hashes = self.load_pdf_context(pdf_path, doc_index, known_pages)
+        pdf_context = format_pages(normalize_pages(pages))
+        sitemap_index = self.load_sitemap(sitemap_path, doc_index)
+        sitemap_links = sitemap_index.all_links()
+        prompt_prefix = self.build_prompt_prefix(pdf_context, sitemap_links)
+        return Corpus(
+            version=0,
+            pdf_hash=pdf_hash,
+            pages=pages,
+            page_hashes=page_hashes,
+            pdf_context=pdf_context,
+            doc_index=doc_index,
+            sitemap_links=sitemap_links,
+            sitemap_index=sitemap_index,
+            prompt_prefix=prompt_prefix,
+            # Covers the PDF, the sitemap and the prompt wording, so cached answers follow document changes
+            docs_version=hashlib.sha256(f"{pdf_hash}:{prompt_prefix.digest}".encode()).hexdigest()[:16],
+        )
+
+    def _install_corpus(self, corpus):
+        """Atomically replace the current corpus and mark any cached copy of the old prefix as stale.
+
+        Runs on the event loop, so the old cache entry is deleted later, off the loop, by the
+        next request that needs the cache.
+        """
+        corpus = corpus._replace(version=next(self._corpus_versions))
+        self.corpus = corpus
+        if self.context_cache:
+            self.context_cache.invalidate()
+        self.logger.info(f"Installed corpus version {corpus.version} (docs version {corpus.docs_version}).")
+        return corpus
+
+    def rebuild_prompt_prefix(self):
+        """Rebuild the current corpus's prompt prefix, e.g. after changing the retrieval mode."""
+        corpus = self.corpus
+        prompt_prefix = self.build_prompt_prefix(corpus.pdf_context, corpus.sitemap_links)
+        return self._install_corpus(corpus._replace(
+            prompt_prefix=prompt_prefix,
+            docs_version=hashlib.sha256(f"{corpus.pdf_hash}:{prompt_prefix.digest}".encode()).hexdigest()[:16],
+        ))
+
+    def build_prompt_prefix(self, pdf_context, sitemap_links):
+        """Assemble the static part of the prompt."""
+        parts = [PROMPT_PREAMBLE]
+        if self.retrieval_mode == "full":
+            # Retrieval prompts carry only the links relevant to each query, in the suffix
+            parts.append(pdf_context)
+            parts.append(f"Here are some relevant links from the sitemap:\n{sitemap_links}")
+        parts.append(PROMPT_INSTRUCTIONS)
+
+        prompt_prefix = PromptPrefix.build(parts)
+        self.logger.info(f"Built prompt prefix of {len(prompt_prefix.text)} characters (~{prompt_prefix.tokens} tokens).")
+        return prompt_prefix
+
+    def load_pdf_context(self, pdf_path, doc_index, known_pages=None):
+        """Load PDF pages into `doc_index`, from the document cache when it is warm."""
         self.logger.info(f"Loading PDF context from {pdf_path}.")
         try:
-            with open(pdf_path, 'rb') as pdf_file:
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                num_pages = len(pdf_reader.pages)
-
-                page_dict = {}
-                for page_num in range(num_pages):
-                    page = pdf_reader.pages[page_num]
-                    page_text = page.extract_text()
-                    page_dict[page_num + 1] = page_text  # Page numbers start from 1
-
-                self.pdf_context = str(page_dict)
-                self.logger.info(f"Loaded {num_pages} pages from {pdf_path}.")
+            start_time = time.time()
+            pages, pdf_hash, page_hashes = load_or_build(pdf_path, doc_index, self.doc_cache, self.logger, known_pages)
+            self.logger.info(
+                f"Loaded {len(pages)} pages ({len(doc_index)} chunks) from {pdf_path} "
+                f"in {time.time() - start_time:.2f} seconds."
+            )
+            return pages, pdf_hash, page_hashes
         except Exception as e:
             self.logger.error("Failed to load PDF content.", exc_info=e)
             raise
 
-    def load_sitemap_links(self, sitemap_path):
-        """Parse the sitemap XML and store links as a string."""
+    def load_sitemap(self, sitemap_path, doc_index=None):
+        """Stream the sitemap (or sitemap index) into a deduplicated, searchable link index."""
         self.logger.info(f"Loading sitemap links from {sitemap_path}.")
         try:
-            tree = ET.parse(sitemap_path)
-            root = tree.getroot()
-            urls = [
-                url.text
-                for url in root.iterfind('.//{http://www.sitemaps.org/schemas/sitemap/0.9}loc')
-            ]
-            self.sitemap_links = "\n".join([f"Link: {url}" for url in urls])
-            self.logger.info(f"Loaded {len(urls)} links from {sitemap_path}.")
+            sitemap_index = SitemapIndex().build(iter_sitemap_urls(sitemap_path), doc_index)
+            self.logger.info(
+                f"Loaded {len(sitemap_index)} links ({sitemap_index.duplicates} duplicates skipped) from {sitemap_path}."
+            )
+            return sitemap_index
         except ET.ParseError as e:
             self.logger.error("Error parsing sitemap.xml.", exc_info=e)
-            self.sitemap_links = ""
             raise
 
-    async def generate_response(self, message):
-        """Generate a response from the Gemini API based on the input message."""
-        if not self.pdf_context or not self.sitemap_links:
-            self.logger.error("PDF Contex is, %s", self.pdf_context)
-            self.logger.error("Sitemap Links is, %s", self.sitemap_links)
+    def _search_documents(self, query, corpus):
+        results = corpus.doc_index.search(
+            query,
+            top_k=self.retrieval_top_k,
+            token_budget=self.retrieval_token_budget,
+        )
+        self.logger.debug("Retrieved %d chunks from pages %s.", len(results), [page for page, _, _ in results])
+        return results
+
+    def retrieve_context(self, query, corpus=None):
+        """Return the page-tagged document excerpts most relevant to the query."""
+        return DocumentIndex.format_results(self._search_documents(query, corpus or self.corpus))
+
+    def retrieve_links(self, query, pages=(), corpus=None):
+        """Return the sitemap links most relevant to the query and the retrieved PDF pages."""
+        return (corpus or self.corpus).sitemap_index.search(query, pages=pages, top_k=self.sitemap_top_k)
+
+    def build_prompt_suffix(self, message, corpus=None):
+        """Build the per-request part of the prompt that follows the static prefix."""
+        corpus = corpus or self.corpus
+        parts = []
+        if self.retrieval_mode != "full":
+            results = self._search_documents(message, corpus)
+            links = self.retrieve_links(message, [page for page, _, _ in results], corpus)
+            parts.append(f"Relevant documentation excerpts:\n{DocumentIndex.format_results(results)}")
+            parts.append(f"Relevant documentation links:\n{SitemapIndex.format_links(links)}")
+        parts.extend([PROMPT_QUERY_INTRO, message])
+        return "\n".join(parts)
+
+    def build_prompt(self, message):
+        """Combine the static prefix and the per-request suffix into a single string."""
+        corpus = self.corpus
+        return f"{corpus.prompt_prefix.text}\n{self.build_prompt_suffix(message, corpus)}"
+
+    def _generate_content(self, prompt_suffix, corpus=None, **kwargs):
+        """Call the model, sending only the suffix when the prefix is cached. Blocking."""
+        corpus = corpus or self.corpus
+        # Requests still running against a replaced corpus send their full prompt
+        if self.context_cache and corpus is self.corpus:
+            model = self.context_cache.get_model(corpus.prompt_prefix)
+            if model is not None:
+                return model.generate_content(prompt_suffix, **kwargs)
+        return self.model_flash.generate_content(f"{corpus.prompt_prefix.text}\n{prompt_suffix}", **kwargs)
+
+    def _prepare_message(self, message, corpus):
+        """Validate the loaded documents and normalize the message to a single string."""
+        if corpus is None:
+            raise NotReady("The documents are still loading.")
+        if not corpus.pdf_context or not corpus.sitemap_links:
+            self.logger.error(
+                "Documents are not loaded: %d characters of PDF context, %d sitemap links.",
+                len(corpus.pdf_context), len(corpus.sitemap_links),
+            )
             raise ValueError("PDF context or sitemap links are not loaded. Please initialize them.")
 
-        self.logger.info(f"Generating response for message: {message}")
+        self.logger.info("Generating response for message: %s", message)
 
         # If message is a list (like user_history), join it into a single string
         if isinstance(message, list):
             message = "\n".join(message)
+        return message
 
-        # Combine the prompt parts into a single string
-        prompt = "\n".join([
-            '''
-            Below are documents from XYZ, a financial services company offering payment aggregation services through API, dashboard, and mobile SDK solutions for businesses.
-            Base link for the documentation: https://xyz.com. In this documentation, ✅ indicates the correct information, and ❌ indicates incorrect information.
-            ''',
-            self.pdf_context,
-            f"Here are some relevant links from the sitemap:\n{self.sitemap_links}",
-            '''
-            You are a super helpful customer support representative bot on Discord and Slack for PortOne.
-            Be friendly and fun to talk to, and provide helpful information to users who reach out to you.
-            Also, provide code snippets or links to the documentation when necessary. Do not give invalid links or code snippets.
-            Adhere strictly to the content provided in the documentation, and do not provide any information that is not present in the documentation.
-            A user has reached out with the following query:
-            ''',
-            message,
-        ])
+    def _build_logged_prompt_suffix(self, message, corpus):
+        with stage("prompt_build"):
+            prompt_suffix = self.build_prompt_suffix(message, corpus)
+        prompt_prefix = corpus.prompt_prefix
+        PROMPT_CHARS.observe(len(prompt_prefix.text) + len(prompt_suffix) + 1, platform=platform_var.get())
+        self.logger.info(
+            "Prompt size: %d prefix + %d suffix characters (~%d tokens).",
+            len(prompt_prefix.text), len(prompt_suffix), prompt_prefix.tokens + estimate_tokens(prompt_suffix),
+        )
+        return prompt_suffix
 
+    async def _call_model(self, prompt_suffix, corpus, user_id, channel_id, priority):
+        """Run the blocking model call through the scheduler when one is configured."""
+        if self.scheduler:
+            return await self.scheduler.run(
+                self._generate_content, prompt_suffix, corpus, user_id=user_id, channel_id=channel_id, priority=priority
+            )
+        return await asyncio.to_thread(self._generate_content, prompt_suffix, corpus)
+
+    async def summarize(self, text, max_tokens=300):
+        """Summarize conversation text at background priority, without the document prefix."""
+        prompt = f"{SUMMARY_INSTRUCTIONS.format(max_words=max_tokens * 3 // 4)}\n{text}"
+        if self.scheduler:
+            response = await self.scheduler.run(self.model_flash.generate_content, prompt, priority=PRIORITY_BACKGROUND)
+        else:
+            response = await asyncio.to_thread(self.model_flash.generate_content, prompt)
+        return response.text
+
+    async def generate_response(self, message, user_id=None, channel_id=None, priority=PRIORITY_AMBIENT):
+        """Generate a response from the Gemini API based on the input message.
+
+        `user_id`, `channel_id` and `priority` are used by the scheduler for fairness and ordering.
+        """
+        # Pin the corpus for the whole request so a concurrent reload cannot mix snapshots
+        corpus = self.corpus
+        message = self._prepare_message(message, corpus)
+
+        if self.answer_cache:
+            cached_answer = await self.answer_cache.get(message, corpus.docs_version)
+            if cached_answer is not None:
+                self.logger.info("Answered from the answer cache.")
+                return cached_answer
+
+        if self.single_flight:
+            return await self.single_flight.do(
+                self._single_flight_key(message, corpus),
+                lambda: self._generate_uncached(message, corpus, user_id, channel_id, priority),
+            )
+        return await self._generate_uncached(message, corpus, user_id, channel_id, priority)
+
+    @staticmethod
+    def _single_flight_key(message, corpus):
+        """Identical concurrent questions against the same documents share one model call."""
+        return hashlib.sha256(f"{corpus.docs_version}\0{normalize_query(message)}".encode("utf-8")).hexdigest()
+
+    async def _generate_uncached(self, message, corpus, user_id, channel_id, priority):
+        """Call the Gemini API for the message and store the answer in the answer cache."""
+        prompt_suffix = self._build_logged_prompt_suffix(message, corpus)
 
         # Log execution time for debugging
         start_time = time.time()
         try:
-            response = await asyncio.to_thread(self.model_flash.generate_content, prompt)
+            response = await self._call_model(prompt_suffix, corpus, user_id, channel_id, priority)
             end_time = time.time()
-            self.logger.info(f"Gemini API call took {end_time - start_time:.2f} seconds.")
+            observe_stage("model", end_time - start_time)
+            self.logger.info("Gemini API call took %.2f seconds.", end_time - start_time)
+            if self.answer_cache:
+                await self.answer_cache.set(message, corpus.docs_version, response.text)
             return response.text
         except Exception as e:
             self.logger.error("Error generating response from Gemini API.", exc_info=e)
             raise
+
+    async def stream_response(self, message, user_id=None, channel_id=None, priority=PRIORITY_AMBIENT):
+        """Yield the response text in deltas as the Gemini API generates it."""
+        # Pin the corpus for the whole request so a concurrent reload cannot mix snapshots
+        corpus = self.corpus
+        message = self._prepare_message(message, corpus)
+
+        if self.answer_cache:
+            cached_answer = await self.answer_cache.get(message, corpus.docs_version)
+            if cached_answer is not None:
+                self.logger.info("Answered from the answer cache.")
+                yield cached_answer
+                return
+
+        if self.single_flight:
+            # The first caller streams; identical concurrent questions get its full answer once it is done
+            deltas = self.single_flight.stream(
+                self._single_flight_key(message, corpus),
+                lambda: self._stream_uncached(message, corpus, user_id, channel_id, priority),
+            )
+        else:
+            deltas = self._stream_uncached(message, corpus, user_id, channel_id, priority)
+        async for delta in deltas:
+            yield delta
+
+    async def _stream_uncached(self, message, corpus, user_id, channel_id, priority):
+        """Stream the Gemini API's answer to the message and store it in the answer cache."""
+        prompt_suffix = self._build_logged_prompt_suffix(message, corpus)
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def produce():
+            # Runs in a worker thread; hands every delta back to the event loop
+            try:
+                for chunk in self._generate_content(prompt_suffix, corpus, stream=True):
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk.text)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        slot = (
+            self.scheduler.slot(user_id=user_id, channel_id=channel_id, priority=priority)
+            if self.scheduler else contextlib.nullcontext()
+        )
+        executor = self.scheduler.executor if self.scheduler else None
+        async with slot:
+            start_time = time.time()
+            first_delta_time = None
+            parts = []
+            producer = loop.run_in_executor(executor, produce)
+            try:
+                while (item := await queue.get()) is not None:
+                    if isinstance(item, Exception):
+                        raise item
+                    if first_delta_time is None:
+                        first_delta_time = time.time()
+                        observe_stage("model_first_token", first_delta_time - start_time)
+                        self.logger.info("Gemini time to first token: %.2f seconds.", first_delta_time - start_time)
+                    parts.append(item)
+                    yield item
+            except Exception as e:
+                self.logger.error("Error streaming response from Gemini API.", exc_info=e)
+                raise
+            finally:
+                if not producer.done():
+                    # The consumer went away early; let the worker thread drain on its own
+                    producer.add_done_callback(lambda future: future.exception())
+
+        observe_stage("model", time.time() - start_time)
+        self.logger.info("Gemini API streaming call took %.2f seconds.", time.time() - start_time)
+        if self.answer_cache and parts:
+            await self.answer_cache.set(message, corpus.docs_version, "".join(parts))
@@ -0,0 +1,327 @@
+"""A Redis stream of answer jobs shared by gateway and worker processes.
+
+Gateways (the Discord/Slack processes) add jobs to the stream and listen for replies on
+their own pub/sub channel. Answer workers read jobs through a consumer group, so each
+job goes to exactly one worker and adding workers scales horizontally. A job is
+acknowledged (and deleted) once its reply is published. Failed jobs are re-queued up to
+`max_attempts` times, and jobs left pending by a crashed worker are claimed by another
+one after `claim_idle` seconds.
+"""
+import asyncio, json, os, socket, time, uuid
+import redis
+from utils.logging import Logger
+from utils.redis import REDIS_ERRORS
+from utils.scheduler import PRIORITY_AMBIENT, SchedulerOverloaded
+from utils.tracing import platform_var, trace_id_var
+
+JOB_STREAM = "chatbot:jobs"
+JOB_GROUP = "answer-workers"
+
+
+class JobFailed(Exception):
+    """Raised on the gateway when a worker reports that a job failed."""
+
+
+class JobQueue:
+    """Adds, reads, acknowledges and retries jobs on a Redis stream."""
+
+    def __init__(self, redis_client, stream=JOB_STREAM, group=JOB_GROUP, max_length=1000, max_attempts=3,
+                 claim_idle=300.0):
+        self.client = redis_client
+        self.stream = stream
+        self.group = group
+        self.max_length = max_length
+        self.max_attempts = max_attempts
+        self.claim_idle = claim_idle
+
+    async def ensure_group(self):
+        """Create the stream and consumer group if they do not exist yet."""
+        try:
+            await self.client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def submit(self, job):
+        """Add a job, shedding it when the backlog is already `max_length` jobs deep."""
+        if await self.client.xlen(self.stream) >= self.max_length:
+            raise SchedulerOverloaded(f"job queue reached {self.max_length} jobs")
+        await self.client.xadd(self.stream, {"job": json.dumps(job)})
+
+    @staticmethod
+    def _decode(entries):
+        return [(entry_id, json.loads(fields["job"])) for entry_id, fields in entries if fields]
+
+    async def read(self, consumer, count=1, block_ms=2000):
+        """Return up to `count` new (entry_id, job) pairs for this consumer."""
+        response = await self.client.xreadgroup(self.group, consumer, {self.stream: ">"}, count=count, block=block_ms)
+        return self._decode(response[0][1]) if response else []
+
+    async def claim_stale(self, consumer, count=10):
+        """Take over jobs another consumer has held for longer than `claim_idle`."""
+        response = await self.client.xautoclaim(
+            self.stream, self.group, consumer, min_idle_time=int(self.claim_idle * 1000), count=count
+        )
+        return self._decode(response[1])
+
+    async def ack(self, entry_id):
+        """Mark a job as done and remove it from the stream."""
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.xack(self.stream, self.group, entry_id)
+            pipe.xdel(self.stream, entry_id)
+            await pipe.execute()
+
+    async def retry(self, entry_id, job):
+        """Re-queue a job with its attempt count incremented; returns False once attempts are used up."""
+        if job.get("attempts", 0) + 1 >= self.max_attempts:
+            return False
+        job = dict(job, attempts=job.get("attempts", 0) + 1)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.xadd(self.stream, {"job": json.dumps(job)})
+            pipe.xack(self.stream, self.group, entry_id)
+            pipe.xdel(self.stream, entry_id)
+            await pipe.execute()
+        return True
+
+    async def reply(self, job, message):
+        """Publish a reply message for a job to its gateway."""
+        await self.client.publish(job["reply_to"], json.dumps(dict(message, job_id=job["id"])))
+
+
+class AnswerWorker:
+    """Pulls answer jobs from the queue and runs them on a local GeminiService."""
+
+    def __init__(self, job_queue: JobQueue, gemini_service, consumer=None, concurrency=16, job_ttl=180.0, logger=None):
+        self.logger = logger or Logger.get_logger(
+            name=__name__,
+            log_level="DEBUG",
+            log_file="logs/worker.log"
+        )
+        self.job_queue = job_queue
+        self.gemini_service = gemini_service
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.concurrency = concurrency
+        self.job_ttl = job_ttl
+        self._tasks = set()
+        self._stats = {"processed": 0, "failed": 0, "retried": 0, "expired": 0, "claimed": 0, "shed": 0}
+
+    async def run(self):
+        """Process jobs until cancelled."""
+        await self.job_queue.ensure_group()
+        claim_task = asyncio.create_task(self._claim_loop())
+        self.logger.info(f"Worker {self.consumer} processing jobs with a concurrency of {self.concurrency}.")
+        try:
+            while True:
+                free = self.concurrency - len(self._tasks)
+                if free <= 0:
+                    # Only read what we can start, so queued jobs stay available to other workers
+                    await asyncio.wait(self._tasks, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                try:
+                    entries = await self.job_queue.read(self.consumer, count=free)
+                except REDIS_ERRORS as e:
+                    self.logger.error("Error reading jobs from Redis.", exc_info=e)
+                    await asyncio.sleep(1)
+                    continue
+                for entry_id, job in entries:
+                    self._start(entry_id, job)
+        finally:
+            claim_task.cancel()
+            for task in self._tasks:
+                task.cancel()
+
+    def _start(self, entry_id, job):
+        task = asyncio.create_task(self._process(entry_id, job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _claim_loop(self):
+        while True:
+            await asyncio.sleep(self.job_queue.claim_idle / 2)
+            try:
+                for entry_id, job in await self.job_queue.claim_stale(self.consumer):
+                    self._stats["claimed"] += 1
+                    self.logger.warning(f"Claimed job {job['id']} abandoned by another worker.")
+                    if not await self.job_queue.retry(entry_id, job):
+                        await self._fail(entry_id, job, "The job was abandoned too many times.")
+            except REDIS_ERRORS as e:
+                self.logger.error("Error claiming stale jobs.", exc_info=e)
+
+    async def _fail(self, entry_id, job, error, overloaded=False):
+        self._stats["shed" if overloaded else "failed"] += 1
+        await self.job_queue.reply(job, {"type": "error", "error": error, "overloaded": overloaded})
+        await self.job_queue.ack(entry_id)
+
+    async def _process(self, entry_id, job):
+        trace_id_var.set(job.get("trace_id", "-"))
+        platform_var.set(job.get("platform", "-"))
+        if time.time() - job["submitted_at"] > self.job_ttl:
+            # The gateway has given up waiting for this one
+            self._stats["expired"] += 1
+            await self.job_queue.ack(entry_id)
+            return
+
+        streamed = False
+        try:
+            payload = job["payload"]
+            if job["kind"] == "generate":
+                text = await self.gemini_service.generate_response(**payload)
+                await self.job_queue.reply(job, {"type": "result", "text": text})
+            elif job["kind"] == "stream":
+                async for delta in self.gemini_service.stream_response(**payload):
+                    streamed = True
+                    await self.job_queue.reply(job, {"type": "delta", "text": delta})
+                await self.job_queue.reply(job, {"type": "result", "text": None})
+            elif job["kind"] == "summarize":
+                text = await self.gemini_service.summarize(**payload)
+                await self.job_queue.reply(job, {"type": "result", "text": text})
+            else:
+                raise ValueError(f"Unknown job kind: {job['kind']}")
+            await self.job_queue.ack(entry_id)
+            self._stats["processed"] += 1
+        except SchedulerOverloaded as e:
+            await self._fail(entry_id, job, str(e), overloaded=True)
+        except asyncio.CancelledError:
+            # Left pending; another worker claims it after claim_idle
+            raise
+        except Exception as e:
+            self.logger.error(f"Job {job['id']} failed on attempt {job.get('attempts', 0) + 1}.", exc_info=e)
+            try:
+                # A partially streamed answer cannot be retried without repeating itself
+                if not streamed and await self.job_queue.retry(entry_id, job):
+                    self._stats["retried"] += 1
+                else:
+                    await self._fail(entry_id, job, str(e))
+            except REDIS_ERRORS as redis_error:
+                self.logger.error("Error re-queuing a failed job.", exc_info=redis_error)
+
+    def stats(self):
+        """Return job counters and the number of jobs in progress."""
+        stats = dict(self._stats)
+        stats["active"] = len(self._tasks)
+        return stats
+
+
+class RemoteGeminiService:
+    """Stands in for GeminiService in gateway processes, running requests on answer workers."""
+
+    def __init__(self, job_queue: JobQueue, result_timeout=180.0, logger=None):
+        self.logger = logger or Logger.get_logger(
+            name=__name__,
+            log_level="DEBUG",
+            log_file="logs/worker.log"
+        )
+        self.job_queue = job_queue
+        self.result_timeout = result_timeout
+        self.reply_channel = f"chatbot:replies:{uuid.uuid4().hex}"
+        self._replies = {}
+        self._pubsub = None
+        self._listener = None
+        self._listener_lock = asyncio.Lock()
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "timeouts": 0}
+
+    async def _ensure_listener(self):
+        async with self._listener_lock:
+            if self._listener is None or self._listener.done():
+                self._pubsub = self.job_queue.client.pubsub(ignore_subscribe_messages=True)
+                await self._pubsub.subscribe(self.reply_channel)
+                self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        """Route reply messages to the requests waiting for them."""
+        while True:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+            except REDIS_ERRORS as e:
+                self.logger.error("Error reading job replies from Redis.", exc_info=e)
+                await asyncio.sleep(1)
+                continue
+            if message is None:
+                continue
+            reply = json.loads(message["data"])
+            queue = self._replies.get(reply["job_id"])
+            if queue is not None:
+                queue.put_nowait(reply)
+
+    async def _submit(self, kind, payload):
+        await self._ensure_listener()
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "payload": payload,
+            "reply_to": self.reply_channel,
+            "attempts": 0,
+            "submitted_at": time.time(),
+            "trace_id": trace_id_var.get(),
+            "platform": platform_var.get(),
+        }
+        self._replies[job["id"]] = asyncio.Queue()
+        try:
+            await self.job_queue.submit(job)
+        except Exception:
+            del self._replies[job["id"]]
+            raise
+        self._stats["submitted"] += 1
+        return job["id"]
+
+    async def _replies_for(self, job_id):
+        """Yield the job's reply messages until its result, raising on errors and timeouts."""
+        queue = self._replies[job_id]
+        deadline = time.monotonic() + self.result_timeout
+        try:
+            while True:
+                try:
+                    reply = await asyncio.wait_for(queue.get(), timeout=max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    self._stats["timeouts"] += 1
+                    raise JobFailed(f"No answer from the workers within {self.result_timeout} seconds.")
+                if reply["type"] == "error":
+                    self._stats["failed"] += 1
+                    if reply.get("overloaded"):
+                        raise SchedulerOverloaded(reply["error"])
+                    raise JobFailed(reply["error"])
+                if reply["type"] == "result":
+                    self._stats["completed"] += 1
+                    yield reply
+                    return
+                yield reply
+        finally:
+            self._replies.pop(job_id, None)
+
+    async def _result(self, kind, payload):
+        job_id = await self._submit(kind, payload)
+        async for reply in self._replies_for(job_id):
+            if reply["type"] == "result":
+                return reply["text"]
+
+    async def generate_response(self, message, user_id=None, channel_id=None, priority=PRIORITY_AMBIENT):
+        """Generate a response on a worker; same interface as GeminiService.generate_response."""
+        return await self._result("generate", {
+            "message": message, "user_id": user_id, "channel_id": channel_id, "priority": priority
+        })
+
+    async def stream_response(self, message, user_id=None, channel_id=None, priority=PRIORITY_AMBIENT):
+        """Yield the response in deltas as the worker streams it."""
+        job_id = await self._submit("stream", {
+            "message": message, "user_id": user_id, "channel_id": channel_id, "priority": priority
+        })
+        async for reply in self._replies_for(job_id):
+            if reply["type"] == "delta":
+                yield reply["text"]
+
+    async def summarize(self, text, max_tokens=300):
+        """Summarize conversation text on a worker."""
+        return await self._result("summarize", {"text": text, "max_tokens": max_tokens})
+
+    async def close(self):
+        """Stop listening for replies."""
+        if self._listener is not None:
+            self._listener.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+
+    def stats(self):
+        """Return job counters and the number of requests waiting for a worker."""
+        stats = dict(self._stats)
+        stats["in_flight"] = len(self._replies)
+        return stats
@@ -1,66 +1,212 @@
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
 from datetime import datetime
+from utils.tracing import TraceIdFilter
+
+
+class _TruncatingFormatter(logging.Formatter):
+    """Formats records on the writer thread, cutting oversized messages."""
+
+    def __init__(self, fmt, datefmt, max_chars):
+        super().__init__(fmt, datefmt=datefmt)
+        self.max_chars = max_chars
+
+    def format(self, record):
+        message = record.getMessage()
+        if len(message) > self.max_chars:
+            record.msg = f"{message[:self.max_chars]}... [{len(message) - self.max_chars} more characters]"
+            record.args = None
+        return super().format(record)
+
+
+class _RateLimitFilter(logging.Filter):
+    """Token-bucket limit per call site for records below WARNING."""
+
+    def __init__(self, rate, burst):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.suppressed = 0
+        self._buckets = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate <= 0:
+            return True
+        key = (record.name, record.lineno)
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            self.suppressed += 1
+            return False
+        if len(self._buckets) > 10000:
+            self._buckets.clear()
+        self._buckets[key] = (tokens - 1, now)
+        return True
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Hands records to the writer thread without blocking, dropping them when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Formatting is deferred to the writer thread; the listener runs in this process,
+        # so the record does not need to be made picklable.
+        return record
+
+
+class _RoutingHandler(logging.Handler):
+    """Runs on the writer thread: writes every record to the console and to its logger's file."""
+
+    def __init__(self, console_handler):
+        super().__init__()
+        self.console_handler = console_handler
+        self.routes = {}
+
+    def emit(self, record):
+        self.console_handler.handle(record)
+        file_handler = self.routes.get(record.name)
+        if file_handler is not None:
+            file_handler.handle(record)
 
 
 class Logger:
     """
     A utility class for consistent logging across the project.
+
+    Loggers only enqueue records; a single background thread formats them and writes
+    them to the console and the rotating log files, so logging never blocks the event
+    loop. The queue is bounded (LOG_QUEUE_SIZE) and drops records when full, messages
+    longer than LOG_MAX_CHARS are truncated, and DEBUG/INFO records are rate limited
+    per call site (LOG_RATE_LIMIT per second, bursts of LOG_RATE_BURST).
     """
 
     _instances = {}
+    _lock = threading.Lock()
+    _queue_handler = None
+    _routing_handler = None
+    _listener = None
+    _rate_limit_filter = None
+    _formatter = None
+    _file_handlers = {}
+
+    @staticmethod
+    def _ensure_listener():
+        """Start the shared queue and writer thread on first use."""
+        if Logger._listener is not None:
+            return
+
+        # Log format, optionally tagged with the per-request trace ID
+        trace_ids = os.getenv("LOG_TRACE_IDS", "false").lower() == "true"
+        Logger._formatter = _TruncatingFormatter(
+            "[%(asctime)s] [%(levelname)s] [%(name)s] [%(trace_id)s] %(message)s" if trace_ids
+            else "[%(asctime)s] [%(levelname)s] [%(name)s] %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S",
+            max_chars=int(os.getenv("LOG_MAX_CHARS", "2000")),
+        )
+
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(Logger._formatter)
+        Logger._routing_handler = _RoutingHandler(console_handler)
+
+        log_queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+        Logger._queue_handler = _DroppingQueueHandler(log_queue)
+        Logger._rate_limit_filter = _RateLimitFilter(
+            rate=float(os.getenv("LOG_RATE_LIMIT", "20")),
+            burst=int(os.getenv("LOG_RATE_BURST", "50")),
+        )
+        Logger._queue_handler.addFilter(Logger._rate_limit_filter)
+
+        Logger._listener = QueueListener(log_queue, Logger._routing_handler)
+        Logger._listener.start()
+        atexit.register(Logger.shutdown)
+
+    @staticmethod
+    def _file_handler(log_file, max_file_size, backup_count):
+        """Return the rotating handler for a log file, shared by every logger writing to it."""
+        path = os.path.abspath(log_file)
+        if path not in Logger._file_handlers:
+            # Ensure log directory exists
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            file_handler = RotatingFileHandler(path, maxBytes=max_file_size, backupCount=backup_count)
+            file_handler.setFormatter(Logger._formatter)
+            Logger._file_handlers[path] = file_handler
+        return Logger._file_handlers[path]
 
     @staticmethod
     def get_logger(name: str, log_level: str = "INFO", log_file: str = None, max_file_size: int = 10 * 1024 * 1024, backup_count: int = 5):
         """
         Get a logger instance with a specific name.
-        
+
         Args:
             name (str): Name of the logger, usually the module's `__name__`.
             log_level (str): Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL).
             log_file (str): Path to the log file. If None, logs are sent to stdout only.
             max_file_size (int): Maximum size of the log file before rotation (default: 10MB).
             backup_count (int): Number of rotated log files to keep (default: 5).
-        
+
         Returns:
             logging.Logger: Configured logger instance.
         """
-        if name in Logger._instances:
-            return Logger._instances[name]
-
-        # Create a logger instance
-        logger = logging.getLogger(name)
-        logger.setLevel(getattr(logging, log_level.upper(), logging.INFO))
-        logger.propagate = False
-
-        # Ensure no duplicate handlers are added
-        if not logger.handlers:
-            # Log format
-            log_format = logging.Formatter(
-                "[%(asctime)s] [%(levelname)s] [%(name)s] %(message)s",
-                datefmt="%Y-%m-%d %H:%M:%S",
-            )
-
-            # Console handler
-            console_handler = logging.StreamHandler()
-            console_handler.setFormatter(log_format)
-            logger.addHandler(console_handler)
-
-            # File handler (optional)
-            if log_file:
-                # Ensure log directory exists
-                os.makedirs(os.path.dirname(log_file), exist_ok=True)
-
-                file_handler = RotatingFileHandler(
-                    log_file, maxBytes=max_file_size, backupCount=backup_count
-                )
-                file_handler.setFormatter(log_format)
-                logger.addHandler(file_handler)
-
-        # Cache the logger instance
-        Logger._instances[name] = logger
-        return logger
+        with Logger._lock:
+            if name in Logger._instances:
+                return Logger._instances[name]
+
+            Logger._ensure_listener()
+
+            # Create a logger instance
+            logger = logging.getLogger(name)
+            logger.setLevel(getattr(logging, log_level.upper(), logging.INFO))
+            logger.propagate = False
+
+            # Ensure no duplicate handlers are added
+            if not logger.handlers:
+                # The trace ID must be read on the calling thread, before the record is queued
+                logger.addFilter(TraceIdFilter())
+                logger.addHandler(Logger._queue_handler)
+
+                # File output (optional), written by the background thread
+                if log_file:
+                    Logger._routing_handler.routes[name] = Logger._file_handler(log_file, max_file_size, backup_count)
+
+            # Cache the logger instance
+            Logger._instances[name] = logger
+            return logger
+
+    @staticmethod
+    def stats():
+        """Return counters for dropped and rate-limited records and the current queue depth."""
+        if Logger._listener is None:
+            return {"dropped": 0, "rate_limited": 0, "queue_depth": 0}
+        return {
+            "dropped": Logger._queue_handler.dropped,
+            "rate_limited": Logger._rate_limit_filter.suppressed,
+            "queue_depth": Logger._queue_handler.queue.qsize(),
+        }
+
+    @staticmethod
+    def shutdown():
+        """Flush queued records and stop the writer thread."""
+        with Logger._lock:
+            if Logger._listener is not None:
+                Logger._listener.stop()
+                Logger._listener = None
 
     @staticmethod
     def clear_instances():
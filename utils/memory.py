@@ -0,0 +1,196 @@
+import asyncio, json, time
+from utils.logging import Logger
+from utils.redis import REDIS_ERRORS
+from utils.text import estimate_tokens
+
+# Append turns, add their tokens to the running total and refresh the TTLs; returns the
+# tokens held by the turns plus the summary
+APPEND_SCRIPT = """
+redis.call('RPUSH', KEYS[1], unpack(ARGV, 3))
+local tokens = redis.call('HINCRBY', KEYS[2], 'tokens', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+return tokens + tonumber(redis.call('HGET', KEYS[2], 'summary_tokens') or '0')
+"""
+
+# Replace the oldest turns with a summary, unless the list changed underneath us
+# (e.g. the history was cleared while the summary was being written)
+COMPACT_SCRIPT = """
+local count = tonumber(ARGV[1])
+if redis.call('LINDEX', KEYS[1], count - 1) ~= ARGV[2] then
+    return 0
+end
+redis.call('LTRIM', KEYS[1], count, -1)
+redis.call('HINCRBY', KEYS[2], 'tokens', -tonumber(ARGV[3]))
+redis.call('HSET', KEYS[2], 'summary', ARGV[4], 'summary_tokens', ARGV[5])
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+redis.call('EXPIRE', KEYS[2], ARGV[6])
+return 1
+"""
+
+SUMMARY_LABEL = "Summary of the earlier conversation:"
+
+
+class ConversationMemory:
+    """Per-user conversation turns in Redis, bounded by a token budget.
+
+    Each turn is stored with its token count. When a user's turns and summary exceed
+    `token_budget`, the oldest turns are folded into a rolling summary by `summarizer`
+    (an async callable taking the text to summarize) in a background task, so the
+    request path never waits on it. Without a summarizer, or if summarizing fails,
+    the oldest turns are dropped instead. Idle users' history expires after `ttl` seconds.
+    """
+
+    def __init__(self, redis_service, summarizer=None, token_budget=2000, max_turn_tokens=500,
+                 summary_tokens=300, ttl=7 * 24 * 3600, key_prefix="memory", logger=None):
+        self.logger = logger or Logger.get_logger(
+            name=__name__,
+            log_level="DEBUG",
+            log_file="logs/memory.log"
+        )
+        self.client = redis_service.client
+        self.summarizer = summarizer
+        self.token_budget = token_budget
+        self.max_turn_tokens = max_turn_tokens
+        self.summary_tokens = summary_tokens
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+        self._append = self.client.register_script(APPEND_SCRIPT)
+        self._compact = self.client.register_script(COMPACT_SCRIPT)
+        self._compacting = {}
+        self._stats = {
+            "turns_added": 0,
+            "truncated_turns": 0,
+            "compactions": 0,
+            "summarized_turns": 0,
+            "dropped_turns": 0,
+            "compaction_conflicts": 0,
+            "errors": 0,
+        }
+
+    def _keys(self, user_id):
+        return [f"{self.key_prefix}:{user_id}:turns", f"{self.key_prefix}:{user_id}:meta"]
+
+    def _turn(self, role, text):
+        """Encode a turn, truncating it to `max_turn_tokens`."""
+        max_chars = self.max_turn_tokens * 4
+        if len(text) > max_chars:
+            self._stats["truncated_turns"] += 1
+            text = text[:max_chars] + " [...]"
+        return json.dumps({"role": role, "text": text, "tokens": estimate_tokens(text), "ts": time.time()})
+
+    @staticmethod
+    def _format(turn):
+        return f"{turn['role']}: {turn['text']}"
+
+    async def get_history(self, user_id):
+        """Return the summary and the most recent turns that fit the token budget, oldest first."""
+        turns_key, meta_key = self._keys(user_id)
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.lrange(turns_key, 0, -1)
+                pipe.hget(meta_key, "summary")
+                raw_turns, summary = await pipe.execute()
+        except REDIS_ERRORS as e:
+            self._stats["errors"] += 1
+            self.logger.error("Error fetching conversation memory from Redis.", exc_info=e)
+            return []
+
+        # Compaction runs in the background, so enforce the budget on read as well
+        remaining = self.token_budget - (estimate_tokens(summary) if summary else 0)
+        history = []
+        for raw_turn in reversed(raw_turns):
+            turn = json.loads(raw_turn)
+            remaining -= turn["tokens"]
+            if remaining < 0 and history:
+                break
+            history.append(self._format(turn))
+        history.reverse()
+        if summary:
+            history.insert(0, f"{SUMMARY_LABEL} {summary}")
+        return history
+
+    async def add_exchange(self, user_id, user_message, bot_response):
+        """Store a user message and the bot's reply, compacting in the background if over budget."""
+        turns = [self._turn("User", user_message), self._turn("Bot", bot_response)]
+        tokens = sum(json.loads(turn)["tokens"] for turn in turns)
+        try:
+            total = await self._append(keys=self._keys(user_id), args=[self.ttl, tokens, *turns])
+        except REDIS_ERRORS as e:
+            self._stats["errors"] += 1
+            self.logger.error("Error adding turns to conversation memory in Redis.", exc_info=e)
+            return
+        self._stats["turns_added"] += len(turns)
+        if total > self.token_budget and user_id not in self._compacting:
+            self._compacting[user_id] = asyncio.create_task(self._compact_user(user_id))
+
+    async def clear(self, user_id):
+        """Delete the user's turns and summary."""
+        try:
+            await self.client.delete(*self._keys(user_id))
+        except REDIS_ERRORS as e:
+            self._stats["errors"] += 1
+            self.logger.error("Error clearing conversation memory in Redis.", exc_info=e)
+
+    async def _compact_user(self, user_id):
+        try:
+            await self.compact(user_id)
+        except Exception as e:
+            self._stats["errors"] += 1
+            self.logger.error(f"Error compacting conversation memory for {user_id}.", exc_info=e)
+        finally:
+            self._compacting.pop(user_id, None)
+
+    async def compact(self, user_id):
+        """Fold the oldest turns into the summary until the user is at half the token budget."""
+        turns_key, meta_key = self._keys(user_id)
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.lrange(turns_key, 0, -1)
+            pipe.hmget(meta_key, "summary", "summary_tokens")
+            raw_turns, (summary, summary_tokens) = await pipe.execute()
+
+        turns = [json.loads(raw_turn) for raw_turn in raw_turns]
+        total = int(summary_tokens or 0) + sum(turn["tokens"] for turn in turns)
+        count, removed_tokens = 0, 0
+        # Always keep the latest exchange verbatim
+        while count < len(turns) - 2 and total - removed_tokens > self.token_budget // 2:
+            removed_tokens += turns[count]["tokens"]
+            count += 1
+        if not count:
+            return
+
+        new_summary = summary or ""
+        if self.summarizer:
+            text = "\n".join(
+                ([f"{SUMMARY_LABEL} {summary}"] if summary else []) + [self._format(turn) for turn in turns[:count]]
+            )
+            try:
+                new_summary = (await self.summarizer(text, self.summary_tokens)).strip()[:self.summary_tokens * 4]
+            except Exception as e:
+                self.logger.warning(f"Summarizing conversation memory failed, dropping {count} old turns.", exc_info=e)
+                self._stats["dropped_turns"] += count
+            else:
+                self._stats["summarized_turns"] += count
+        else:
+            self._stats["dropped_turns"] += count
+
+        applied = await self._compact(
+            keys=[turns_key, meta_key],
+            args=[count, raw_turns[count - 1], removed_tokens, new_summary, estimate_tokens(new_summary), self.ttl],
+        )
+        if applied:
+            self._stats["compactions"] += 1
+            self.logger.debug(f"Compacted {count} turns for {user_id} ({removed_tokens} tokens).")
+        else:
+            self._stats["compaction_conflicts"] += 1
+
+    async def drain(self):
+        """Wait for background compactions to finish."""
+        while self._compacting:
+            await asyncio.gather(*list(self._compacting.values()), return_exceptions=True)
+
+    def stats(self):
+        """Return turn, compaction and error counters."""
+        stats = dict(self._stats)
+        stats["compactions_pending"] = len(self._compacting)
+        return stats
@@ -0,0 +1,257 @@
+"""Outbound message delivery shared by the chat bots.
+
+Long answers are split at markdown boundaries instead of fixed offsets: between
+paragraphs and code blocks first, then lines, sentences and words. A code block that
+has to be split is closed and reopened with the same fence, so every message renders.
+"""
+import asyncio, re, time
+from collections import deque
+from typing import Any, Callable, NamedTuple
+from utils.logging import Logger
+from utils.metrics import DELIVERY_SECONDS
+from utils.rate_limit import TokenBucket
+from utils.streaming import split_at_boundary
+
+CODE_FENCE = "```"
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+
+
+def _blocks(text):
+    """Split markdown into paragraphs and fenced code blocks."""
+    blocks, current, in_fence = [], [], False
+    for line in text.split("\n"):
+        if line.lstrip().startswith(CODE_FENCE):
+            if not in_fence and current:
+                blocks.append("\n".join(current))
+                current = []
+            current.append(line)
+            if in_fence:
+                blocks.append("\n".join(current))
+                current = []
+            in_fence = not in_fence
+        elif in_fence or line.strip():
+            current.append(line)
+        elif current:
+            blocks.append("\n".join(current))
+            current = []
+    if current:
+        blocks.append("\n".join(current))
+    return blocks
+
+
+def _pack(pieces, max_length, separator):
+    """Greedily join pieces (each within max_length) into as few chunks as possible."""
+    chunks = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) + len(separator) + len(piece) <= max_length:
+            chunks[-1] += separator + piece
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+def _hard_split(text, max_length):
+    """Split at newlines or spaces, or mid-word as a last resort."""
+    pieces = []
+    while text:
+        head, text = split_at_boundary(text, max_length)
+        pieces.append(head)
+    return pieces
+
+
+def _split_prose(block, max_length):
+    pieces = []
+    for line in block.split("\n"):
+        if len(line) <= max_length:
+            pieces.append(line)
+            continue
+        sentences = []
+        for sentence in SENTENCE_BREAK.split(line):
+            sentences.extend([sentence] if len(sentence) <= max_length else _hard_split(sentence, max_length))
+        pieces.extend(_pack(sentences, max_length, " "))
+    return _pack(pieces, max_length, "\n")
+
+
+def _split_code(block, max_length):
+    lines = block.split("\n")
+    opener = lines[0].strip()
+    body = lines[1:-1] if len(lines) > 1 and lines[-1].strip().startswith(CODE_FENCE) else lines[1:]
+    # Room left for the body once the fence is reopened and closed around it
+    budget = max(1, max_length - len(opener) - len(CODE_FENCE) - 2)
+    pieces = []
+    for line in body:
+        pieces.extend([line] if len(line) <= budget else _hard_split(line, budget))
+    return [f"{opener}\n{chunk}\n{CODE_FENCE}" for chunk in _pack(pieces, budget, "\n")]
+
+
+def split_message(text, max_length):
+    """Split text into messages of at most max_length characters at markdown, code-fence and sentence boundaries."""
+    pieces = []
+    for block in _blocks(text):
+        if len(block) <= max_length:
+            pieces.append(block)
+        elif block.lstrip().startswith(CODE_FENCE):
+            pieces.extend(_split_code(block, max_length))
+        else:
+            pieces.extend(_split_prose(block, max_length))
+    return _pack(pieces, max_length, "\n\n")
+
+
+def rate_limit_retry_after(error):
+    """Return the seconds to wait if `error` is an HTTP 429 from Slack or Discord, otherwise None."""
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None) or getattr(error, "status", None)
+    if status != 429:
+        return None
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is None:
+        retry_after = _lower_keys(getattr(response, "headers", None)).get("retry-after") or 1.0
+    return float(retry_after)
+
+
+def _lower_keys(headers):
+    return {str(name).lower(): value for name, value in (headers or {}).items()}
+
+
+class Outgoing(NamedTuple):
+    text: str
+    post: Callable
+    future: Any
+    enqueued_at: float
+
+
+class OutboundSender:
+    """Delivers bot messages in order through one queue per destination.
+
+    `deliver(destination, text, post)` queues the text for a destination (a channel or
+    thread) and returns the platform responses once it is sent; `post(chunk)` sends one
+    message. Messages waiting for the same destination are merged while they fit in one
+    message. Sends are paced by a token bucket of `rate` messages per second (bursts of
+    `burst`) per rate-limit bucket, the destination unless `bucket` names another (e.g.
+    the channel of a thread). A 429 pauses its bucket and is retried after the delay it
+    asks for (`Retry-After`).
+    """
+
+    def __init__(self, platform, max_length, rate=1.0, burst=5, max_retries=3, logger=None):
+        self.logger = logger or Logger.get_logger(
+            name=__name__,
+            log_level="DEBUG",
+            log_file="logs/outbound.log"
+        )
+        self.platform = platform
+        self.max_length = max_length
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self._queues = {}
+        self._buckets = {}
+        self._blocked_until = {}
+        self._tasks = set()
+        self._stats = {"messages": 0, "merged": 0, "chunks": 0, "rate_limited": 0, "failures": 0, "paced_seconds": 0.0,
+                       "indicators": 0, "indicators_skipped": 0}
+
+    async def deliver(self, destination, text, post, bucket=None):
+        """Queue `text` for `destination` and wait until it has been sent; returns the post() results."""
+        if not text:
+            return []
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queue = self._queues.get(destination)
+        if queue is None:
+            queue = self._queues[destination] = deque()
+            task = loop.create_task(self._drain(destination, queue, destination if bucket is None else bucket))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        queue.append(Outgoing(text, post, future, time.monotonic()))
+        self._stats["messages"] += 1
+        return await future
+
+    async def indicate(self, destination, text, post, bucket=None):
+        """Post a status message such as "Typing..." right away, outside the queue and the token bucket.
+
+        Skipped while the destination has messages queued or its bucket is paused by a 429,
+        so status messages never delay or crowd out answers. Failures are logged, not raised.
+        """
+        key = destination if bucket is None else bucket
+        if destination in self._queues or self._blocked_until.get(key, 0.0) > time.monotonic():
+            self._stats["indicators_skipped"] += 1
+            return None
+        try:
+            response = await post(text)
+        except Exception as e:
+            retry_after = rate_limit_retry_after(e)
+            if retry_after is not None:
+                self._blocked_until[key] = time.monotonic() + retry_after
+            self._stats["indicators_skipped"] += 1
+            self.logger.warning(f"Failed to send a status message to {destination}: {e}")
+            return None
+        self._stats["indicators"] += 1
+        return response
+
+    async def _drain(self, destination, queue, bucket):
+        try:
+            while queue:
+                batch = [queue.popleft()]
+                text = batch[0].text
+                # Merge small messages that queued up behind this one
+                while queue and len(text) + 2 + len(queue[0].text) <= self.max_length:
+                    batch.append(queue.popleft())
+                    text += "\n\n" + batch[-1].text
+                self._stats["merged"] += len(batch) - 1
+                try:
+                    responses = [
+                        await self._send_chunk(bucket, batch[0].post, chunk)
+                        for chunk in split_message(text, self.max_length)
+                    ]
+                except Exception as e:
+                    self._stats["failures"] += 1
+                    for item in batch:
+                        if not item.future.done():
+                            item.future.set_exception(e)
+                    continue
+                now = time.monotonic()
+                for item in batch:
+                    DELIVERY_SECONDS.observe(now - item.enqueued_at, platform=self.platform)
+                    if not item.future.done():
+                        item.future.set_result(responses)
+        finally:
+            del self._queues[destination]
+            for item in queue:
+                item.future.cancel()
+
+    async def _send_chunk(self, bucket, post, chunk):
+        for attempt in range(self.max_retries + 1):
+            await self._pace(bucket)
+            try:
+                response = await post(chunk)
+            except Exception as e:
+                retry_after = rate_limit_retry_after(e)
+                if retry_after is None or attempt == self.max_retries:
+                    raise
+                self._stats["rate_limited"] += 1
+                self._blocked_until[bucket] = time.monotonic() + retry_after
+                self.logger.warning(f"Rate limited sending to {bucket}, retrying in {retry_after:.2f} seconds.")
+                continue
+            self._stats["chunks"] += 1
+            return response
+
+    async def _pace(self, key):
+        """Wait for a token from the bucket and for any server-imposed pause."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) > 10000:
+                # Forget buckets that have fully refilled so memory stays bounded
+                for idle_key in [k for k, b in self._buckets.items() if b.is_idle()]:
+                    del self._buckets[idle_key]
+                    self._blocked_until.pop(idle_key, None)
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+        delay = max(bucket.reserve(), self._blocked_until.get(key, 0.0) - time.monotonic())
+        if delay > 0:
+            self._stats["paced_seconds"] += delay
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        """Return delivery counters and the number of destinations with queued messages."""
+        stats = dict(self._stats)
+        stats["queued_destinations"] = len(self._queues)
+        return stats
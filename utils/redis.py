@@ -1,54 +1,84 @@
 import redis
+import redis.asyncio as aioredis
 from utils.logging import Logger
 
+# Append entries (if any), trim to the last N and return them, in a single round trip
+HISTORY_SCRIPT = """
+if #ARGV > 1 then
+    redis.call('RPUSH', KEYS[1], unpack(ARGV, 2))
+end
+local max_length = tonumber(ARGV[1])
+redis.call('LTRIM', KEYS[1], -max_length, -1)
+return redis.call('LRANGE', KEYS[1], -max_length, -1)
+"""
+
+# Connection problems as well as server-side errors such as a failing Lua script
+REDIS_ERRORS = (redis.RedisError,)
+
 # Redis Service for History Management
 class RedisService:
-    def __init__(self, redis_url):
+    def __init__(self, redis_url, max_connections=50, client=None):
         self.logger = Logger.get_logger(
             name=__name__,
             log_level="DEBUG",
             log_file="logs/redis.log"
         )
-        self.logger.info("Connecting to Redis, with URL: %s", redis_url)
-        try:
-            self.client = redis.StrictRedis.from_url(redis_url, decode_responses=True, socket_timeout=10)
-        except redis.ConnectionError as e:
-            self.logger.error("Failed to connect to Redis.", exc_info=e)
-            raise
+        if client is not None:
+            # A pre-built client, e.g. fakeredis in the benchmark harness
+            self.pool = None
+            self.client = client
+        else:
+            self.logger.info("Connecting to Redis, with URL: %s", redis_url)
+            # One pool shared by history, caches and every bot running on this event loop
+            self.pool = aioredis.ConnectionPool.from_url(
+                redis_url, decode_responses=True, socket_timeout=10, max_connections=max_connections
+            )
+            self.client = aioredis.Redis(connection_pool=self.pool)
+        self._history_script = self.client.register_script(HISTORY_SCRIPT)
+
+    async def ping(self):
+        """Check the connection to Redis."""
         try:
-            self.client.ping()
+            await self.client.ping()
             self.logger.info("Redis ping successful.")
-        except redis.ConnectionError as e:
+        except REDIS_ERRORS as e:
             self.logger.error("Failed to ping Redis.", exc_info=e)
             raise
-        
-    def get_user_history(self, user_id, max_length=5):
-        """Retrieve the user's message history, ensuring it doesn't exceed the maximum length."""
+
+    async def close(self):
+        """Close the client and disconnect the connection pool."""
+        await self.client.aclose()
+        if self.pool is not None:
+            await self.pool.disconnect()
+
+    async def get_user_history(self, user_id, max_length=5):
+        """Retrieve the user's most recent messages, trimming older ones in the same round trip."""
         try:
-            history = self.client.lrange(user_id, 0, -1) or []
-            return history[-max_length:]  # Return only the most recent messages
-        except redis.ConnectionError as e:
+            return await self._history_script(keys=[user_id], args=[max_length]) or []
+        except REDIS_ERRORS as e:
             self.logger.error("Error fetching user history from Redis.", exc_info=e)
             return []
-       
 
-    def add_to_user_history(self, user_id, user_message, bot_response):
-        """Add a message to the user's history in Redis."""
+    async def add_to_user_history(self, user_id, user_message, bot_response, max_length=5):
+        """Add a message to the user's history in Redis, keeping only the last max_length entries."""
         try:
-            self.client.rpush(user_id, f"User: {user_message}", f"Bot: {bot_response}")
-        except redis.ConnectionError as e:
+            await self._history_script(
+                keys=[user_id],
+                args=[max_length, f"User: {user_message}", f"Bot: {bot_response}"],
+            )
+        except REDIS_ERRORS as e:
             self.logger.error("Error adding message to user history in Redis.", exc_info=e)
 
-    def trim_history(self, user_id, max_length=5):
+    async def trim_history(self, user_id, max_length=5):
         """Trim the user's message history to the maximum length."""
         try:
-            self.client.ltrim(user_id, -max_length, -1)
-        except redis.ConnectionError as e:
+            await self.client.ltrim(user_id, -max_length, -1)
+        except REDIS_ERRORS as e:
             self.logger.error("Error trimming user history in Redis.", exc_info=e)
 
-    def clear_history(self, user_id):
+    async def clear_history(self, user_id):
         """Clear the message history for a specific user."""
         try:
-            self.client.delete(user_id)
-        except redis.ConnectionError as e:
+            await self.client.delete(user_id)
+        except REDIS_ERRORS as e:
             self.logger.error("Error clearing user history in Redis.", exc_info=e)
@@ -0,0 +1,154 @@
+"""A cheap local check of whether a chat message is a documentation question for the bot.
+
+Runs before any model call so that public-channel chatter ("lol", "thanks", messages
+meant for other people) never reaches Gemini. Trivial intents addressed to the bot get
+canned replies instead of a model call.
+"""
+import re
+from typing import NamedTuple
+from utils.logging import Logger
+from utils.text import tokenize
+
+ANSWER, REPLY, IGNORE = "answer", "reply", "ignore"
+# Channel modes, from most to least permissive
+MODES = ("all", "questions", "mentions", "off")
+
+MENTION_PATTERN = re.compile(r"<@[!&]?\w+>")
+INTENT_PATTERNS = {
+    "greeting": re.compile(r"^(hi|hello|hey|yo|hiya|howdy|good (morning|afternoon|evening))( there| all| everyone| bot)?[\s!.]*$"),
+    "thanks": re.compile(r"^(thanks|thank you|thx|ty|cheers|thanks a lot|thank you so much)( bot)?[\s!.]*$"),
+    "help": re.compile(r"^(help|what can you do|how do you work|who are you)[\s?!.]*$"),
+}
+CANNED_REPLIES = {
+    "greeting": "Hi! Ask me anything about the documentation.",
+    "thanks": "You're welcome! Let me know if you have any other questions.",
+    "help": "Ask me a question about the documentation by mentioning me, replying to me or sending me a direct message.",
+}
+QUESTION_WORDS = {
+    "how", "what", "why", "where", "when", "which", "who", "can", "could", "does", "do", "is", "are",
+    "should", "would", "will", "explain", "anyone", "any", "help",
+}
+STOPWORDS = {
+    "the", "and", "for", "you", "your", "are", "was", "were", "can", "could", "does", "did", "how", "what",
+    "why", "where", "when", "which", "who", "this", "that", "with", "from", "have", "has", "there", "any",
+    "anyone", "about", "should", "would", "will", "get", "use", "not", "but", "into", "them", "they", "its",
+}
+
+
+class Decision(NamedTuple):
+    action: str
+    reason: str
+    reply: str = None
+
+
+def parse_channel_modes(value):
+    """Parse `channel_id:mode,channel_id:mode` into a {channel_id: mode} mapping."""
+    channel_modes = {}
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        channel_id, _, mode = item.strip().rpartition(":")
+        if mode not in MODES or not channel_id:
+            raise ValueError(f"Invalid channel mode {item!r}, expected <channel id>:<{'|'.join(MODES)}>.")
+        channel_modes[channel_id] = mode
+    return channel_modes
+
+
+class RelevanceGate:
+    """Decides whether to answer, send a canned reply to, or ignore a message.
+
+    Messages addressed to the bot (DMs, mentions, replies to the bot) are answered. Other
+    messages are handled according to the channel's mode: `all` answers everything,
+    `questions` answers messages that look like questions about the documentation,
+    `mentions` only answers addressed messages and `off` ignores the channel entirely.
+    The documentation check uses the current corpus of `gemini_service`; it is skipped
+    when the service has no local corpus, as in gateway mode.
+    """
+
+    def __init__(self, gemini_service=None, default_mode="questions", channel_modes=None, min_doc_overlap=0.5,
+                 replies=None, logger=None):
+        self.logger = logger or Logger.get_logger(
+            name=__name__,
+            log_level="DEBUG",
+            log_file="logs/relevance.log"
+        )
+        if default_mode not in MODES:
+            raise ValueError(f"Invalid relevance mode {default_mode!r}, expected one of {', '.join(MODES)}.")
+        self.gemini_service = gemini_service
+        self.default_mode = default_mode
+        self.channel_modes = dict(channel_modes or {})
+        self.min_doc_overlap = min_doc_overlap
+        self.replies = {**CANNED_REPLIES, **(replies or {})}
+        self._stats = {ANSWER: 0, REPLY: 0, IGNORE: 0}
+
+    def mode_for(self, channel_id):
+        """Return the mode configured for a channel, or the default mode."""
+        return self.channel_modes.get(str(channel_id), self.default_mode)
+
+    @staticmethod
+    def intent(text):
+        """Return the trivial intent (greeting, thanks, help) the whole message expresses, if any."""
+        normalized = " ".join(text.lower().split())
+        for intent, pattern in INTENT_PATTERNS.items():
+            if pattern.match(normalized):
+                return intent
+        return None
+
+    @staticmethod
+    def looks_like_question(text):
+        """A question mark, or a question word or request opening a message of three or more words."""
+        words = text.lower().split()
+        if len(words) < 3:
+            return False
+        return text.rstrip().endswith("?") or words[0].strip(",") in QUESTION_WORDS
+
+    def doc_overlap(self, text):
+        """Return the share of the message's content words that occur in the documentation, or None."""
+        corpus = getattr(self.gemini_service, "corpus", None)
+        if corpus is None or not corpus.doc_index.vocabulary:
+            return None
+        words = {word for word in tokenize(text) if len(word) > 2 and word not in STOPWORDS and not word.isdigit()}
+        if not words:
+            return 0.0
+        return sum(word in corpus.doc_index.vocabulary for word in words) / len(words)
+
+    def check(self, text, channel_id=None, direct=False, addressed_elsewhere=False):
+        """Decide how to handle a message.
+
+        `direct` marks DMs, mentions of the bot and replies to the bot; `addressed_elsewhere`
+        marks messages that mention or reply to someone else.
+        """
+        decision = self._decide(MENTION_PATTERN.sub(" ", text or "").strip(), channel_id, direct, addressed_elsewhere)
+        self._stats[decision.action] += 1
+        reason_key = f"{decision.action}_{decision.reason}"
+        self._stats[reason_key] = self._stats.get(reason_key, 0) + 1
+        self.logger.debug("Relevance decision %s (%s) in channel %s.", decision.action, decision.reason, channel_id)
+        return decision
+
+    def _decide(self, text, channel_id, direct, addressed_elsewhere):
+        mode = self.mode_for(channel_id) if channel_id is not None else "all"
+        if mode == "off":
+            return Decision(IGNORE, "channel_off")
+        if direct and not text:
+            return Decision(REPLY, "greeting", self.replies["greeting"])
+        intent = self.intent(text)
+        if intent:
+            return Decision(REPLY, intent, self.replies[intent]) if direct else Decision(IGNORE, "chatter")
+        if direct:
+            return Decision(ANSWER, "direct")
+        if addressed_elsewhere:
+            return Decision(IGNORE, "addressed_elsewhere")
+        if mode == "all":
+            return Decision(ANSWER, "channel_all")
+        if mode == "mentions":
+            return Decision(IGNORE, "not_addressed")
+        if not self.looks_like_question(text):
+            return Decision(IGNORE, "not_question")
+        overlap = self.doc_overlap(text)
+        if overlap is not None and overlap < self.min_doc_overlap:
+            return Decision(IGNORE, "off_topic")
+        return Decision(ANSWER, "question")
+
+    def stats(self):
+        """Return how many messages were answered, given canned replies or ignored, in total and per reason."""
+        return dict(self._stats)
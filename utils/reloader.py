@@ -0,0 +1,99 @@
+import asyncio, os, time
+from utils.logging import Logger
+
+
+class DocumentReloader:
+    """Reloads the documentation into a GeminiService without restarting the bots.
+
+    Polls the PDF and sitemap modification times every `poll_interval` seconds (0 disables
+    polling) and reloads once a change has been stable for one poll, so half-copied files
+    are skipped. `request_reload` serves the admin command and SIGHUP. Parsing runs in a
+    worker thread and re-extracts only changed pages; the new corpus is swapped in
+    atomically while in-flight requests finish against the snapshot they started with.
+    """
+
+    def __init__(self, gemini_service, poll_interval=30.0, logger=None):
+        self.logger = logger or Logger.get_logger(
+            name=__name__,
+            log_level="DEBUG",
+            log_file="logs/reloader.log"
+        )
+        self.gemini_service = gemini_service
+        self.poll_interval = poll_interval
+        self._lock = asyncio.Lock()
+        self._loaded_fingerprint = self._fingerprint()
+        self._task = None
+        self._pending = set()
+        self._stats = {"reloads": 0, "failures": 0, "last_reload_seconds": 0.0}
+
+    def _fingerprint(self):
+        """Return the modification time and size of the watched files."""
+        fingerprint = []
+        for path in (self.gemini_service.pdf_path, self.gemini_service.sitemap_path):
+            try:
+                stat = os.stat(path)
+                fingerprint.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                fingerprint.append(None)
+        return tuple(fingerprint)
+
+    async def reload(self, force=False):
+        """Reload the documents if they changed (or always, with `force`); return the new corpus or None."""
+        async with self._lock:
+            fingerprint = self._fingerprint()
+            if not force and fingerprint == self._loaded_fingerprint:
+                return None
+            start_time = time.time()
+            try:
+                corpus = await self.gemini_service.reload_documents_async()
+            except Exception as e:
+                self._stats["failures"] += 1
+                self.logger.error("Failed to reload documents, keeping the current corpus.", exc_info=e)
+                return None
+            finally:
+                # Do not retry a broken file until it changes again
+                self._loaded_fingerprint = fingerprint
+            self._stats["reloads"] += 1
+            self._stats["last_reload_seconds"] = time.time() - start_time
+            self.logger.info(
+                f"Reloaded documents as corpus version {corpus.version} in {self._stats['last_reload_seconds']:.2f} seconds."
+            )
+            return corpus
+
+    def request_reload(self):
+        """Schedule a forced reload, e.g. from a signal handler."""
+        task = asyncio.get_running_loop().create_task(self.reload(force=True))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _watch(self):
+        previous = self._loaded_fingerprint
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            fingerprint = self._fingerprint()
+            if fingerprint != self._loaded_fingerprint and fingerprint == previous:
+                await self.reload()
+            previous = fingerprint
+
+    def start(self):
+        """Start watching the files."""
+        if self.poll_interval > 0 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._watch())
+            self.logger.info(f"Watching documents for changes every {self.poll_interval} seconds.")
+
+    async def close(self):
+        """Stop watching the files."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        """Return the corpus version and reload counters."""
+        stats = dict(self._stats)
+        corpus = self.gemini_service.corpus
+        stats["corpus_version"] = corpus.version if corpus else 0
+        return stats
@@ -0,0 +1,154 @@
+import numpy as np
+from utils.text import estimate_tokens, tokenize
+
+
+class DocumentIndex:
+    """A local BM25 index over overlapping chunks of the PDF pages."""
+
+    def __init__(self, chunk_size=200, chunk_overlap=50, k1=1.5, b=0.75):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size.")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.k1 = k1
+        self.b = b
+
+        self.chunk_texts = []
+        self.chunk_pages = np.zeros(0, dtype=np.int32)
+        self.vocabulary = {}
+        # Term -> chunk postings in CSC layout, holding precomputed BM25 weights
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.zeros(0, dtype=np.int32)
+        self.weights = np.zeros(0, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.chunk_texts)
+
+    def _chunk_page(self, text):
+        """Split a page into overlapping word windows."""
+        words = text.split()
+        if not words:
+            return []
+        step = self.chunk_size - self.chunk_overlap
+        chunks = []
+        for start in range(0, len(words), step):
+            chunks.append(" ".join(words[start:start + self.chunk_size]))
+            if start + self.chunk_size >= len(words):
+                break
+        return chunks
+
+    def build(self, pages):
+        """Build the index from a {page_number: text} mapping."""
+        chunk_texts, chunk_pages = [], []
+        for page_num, text in sorted(pages.items()):
+            for chunk in self._chunk_page(text or ""):
+                chunk_texts.append(chunk)
+                chunk_pages.append(page_num)
+
+        vocabulary = {}
+        rows, cols, counts = [], [], []
+        doc_lengths = np.zeros(len(chunk_texts), dtype=np.float32)
+        for chunk_id, chunk in enumerate(chunk_texts):
+            tokens = tokenize(chunk)
+            doc_lengths[chunk_id] = len(tokens)
+            term_ids, term_counts = np.unique(
+                np.asarray([vocabulary.setdefault(token, len(vocabulary)) for token in tokens], dtype=np.int64),
+                return_counts=True,
+            )
+            rows.append(term_ids)
+            cols.append(np.full(len(term_ids), chunk_id, dtype=np.int32))
+            counts.append(term_counts)
+
+        self.chunk_texts = chunk_texts
+        self.chunk_pages = np.asarray(chunk_pages, dtype=np.int32)
+        self.vocabulary = vocabulary
+
+        if not chunk_texts or not vocabulary:
+            self.indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+            self.indices = np.zeros(0, dtype=np.int32)
+            self.weights = np.zeros(0, dtype=np.float32)
+            return self
+
+        term_ids = np.concatenate(rows)
+        chunk_ids = np.concatenate(cols)
+        tf = np.concatenate(counts).astype(np.float32)
+
+        # Sort postings by term so every term owns one contiguous slice
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, chunk_ids, tf = term_ids[order], chunk_ids[order], tf[order]
+
+        num_chunks = len(chunk_texts)
+        df = np.bincount(term_ids, minlength=len(vocabulary)).astype(np.float32)
+        idf = np.log(1.0 + (num_chunks - df + 0.5) / (df + 0.5))
+        avg_length = max(float(doc_lengths.mean()), 1.0)
+        norm = self.k1 * (1.0 - self.b + self.b * doc_lengths[chunk_ids] / avg_length)
+
+        self.weights = (idf[term_ids] * tf * (self.k1 + 1.0) / (tf + norm)).astype(np.float32)
+        self.indices = chunk_ids.astype(np.int32)
+        self.indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(df.astype(np.int64), out=self.indptr[1:])
+        return self
+
+    def params(self):
+        """Return the parameters the index was built with."""
+        return {"chunk_size": self.chunk_size, "chunk_overlap": self.chunk_overlap, "k1": self.k1, "b": self.b}
+
+    def get_state(self):
+        """Return the built index as plain strings and NumPy arrays for serialization."""
+        return {
+            "chunk_texts": self.chunk_texts,
+            "vocabulary": sorted(self.vocabulary, key=self.vocabulary.get),
+            "chunk_pages": self.chunk_pages,
+            "indptr": self.indptr,
+            "indices": self.indices,
+            "weights": self.weights,
+        }
+
+    def set_state(self, state):
+        """Restore an index previously returned by get_state."""
+        self.chunk_texts = list(state["chunk_texts"])
+        self.vocabulary = {term: term_id for term_id, term in enumerate(state["vocabulary"])}
+        self.chunk_pages = state["chunk_pages"]
+        self.indptr = state["indptr"]
+        self.indices = state["indices"]
+        self.weights = state["weights"]
+        return self
+
+    def score(self, query):
+        """Return the BM25 score of every chunk for the query."""
+        scores = np.zeros(len(self.chunk_texts), dtype=np.float32)
+        for token in set(tokenize(query)):
+            term_id = self.vocabulary.get(token)
+            if term_id is None:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            # Chunk ids are unique within a posting list, so fancy-index add is safe
+            scores[self.indices[start:end]] += self.weights[start:end]
+        return scores
+
+    def search(self, query, top_k=8, token_budget=None):
+        """Return up to top_k (page, text, score) results within the token budget."""
+        if not self.chunk_texts:
+            return []
+        scores = self.score(query)
+        candidates = np.flatnonzero(scores > 0)
+        if candidates.size == 0:
+            return []
+        if candidates.size > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        results, used_tokens = [], 0
+        for chunk_id in candidates:
+            text = self.chunk_texts[chunk_id]
+            tokens = estimate_tokens(text)
+            if token_budget is not None and used_tokens + tokens > token_budget:
+                continue
+            used_tokens += tokens
+            results.append((int(self.chunk_pages[chunk_id]), text, float(scores[chunk_id])))
+        return results
+
+    @staticmethod
+    def format_results(results):
+        """Render search results as page-tagged excerpts for the prompt."""
+        return "\n\n".join(f"[Page {page}]\n{text}" for page, text, _ in results)
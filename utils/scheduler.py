@@ -0,0 +1,160 @@
+import asyncio, functools, heapq, itertools, random, time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from utils.logging import Logger
+from utils.metrics import observe_stage
+from utils.rate_limit import TokenBucket
+
+# Lower values are served first
+PRIORITY_DIRECT = 0     # DMs and mentions
+PRIORITY_AMBIENT = 1    # Other channel messages
+PRIORITY_BACKGROUND = 2 # Housekeeping such as conversation summaries
+
+OVERLOADED_MESSAGE = "I'm getting a lot of questions right now, please try again in a minute. 🙏"
+
+
+def quota_errors():
+    """Return the Gemini quota error types.
+
+    The Google client (and grpc) is imported here rather than at module level so gateway
+    processes, which use this module only for its constants, never load it.
+    """
+    from google.api_core import exceptions as google_exceptions
+    return google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests
+
+
+class SchedulerOverloaded(Exception):
+    """Raised when a request is shed because the queue is too deep or the sender is over their rate."""
+
+
+class GeminiScheduler:
+    """Bounds concurrent Gemini calls with per-user/per-channel fairness, priorities and backpressure."""
+
+    def __init__(self, max_concurrency=8, max_workers=None, max_queue=100, max_wait=30.0,
+                 user_rate=0.2, user_burst=3, channel_rate=1.0, channel_burst=10,
+                 max_retries=3, retry_base_delay=1.0, logger=None):
+        self.logger = logger or Logger.get_logger(
+            name=__name__,
+            log_level="DEBUG",
+            log_file="logs/scheduler.log"
+        )
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.user_rate, self.user_burst = user_rate, user_burst
+        self.channel_rate, self.channel_burst = channel_rate, channel_burst
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or max_concurrency, thread_name_prefix="gemini"
+        )
+
+        self._user_buckets = {}
+        self._channel_buckets = {}
+        self._heap = []
+        self._sequence = itertools.count()
+        self._active = 0
+        self._waiting = 0
+        self._stats = {"admitted": 0, "shed": 0, "retries": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+
+    def _bucket(self, buckets, key, rate, capacity):
+        bucket = buckets.get(key)
+        if bucket is None:
+            if len(buckets) > 10000:
+                # Forget buckets that have fully refilled so memory stays bounded
+                for idle_key in [k for k, b in buckets.items() if b.is_idle()]:
+                    del buckets[idle_key]
+            bucket = buckets[key] = TokenBucket(rate, capacity)
+        return bucket
+
+    def _shed(self, reason):
+        self._stats["shed"] += 1
+        self.logger.warning(f"Shedding Gemini request: {reason}.")
+        raise SchedulerOverloaded(reason)
+
+    @asynccontextmanager
+    async def slot(self, user_id=None, channel_id=None, priority=PRIORITY_AMBIENT):
+        """Wait for the caller's rate limits and a free concurrency slot, then hold the slot."""
+        if self._waiting >= self.max_queue:
+            self._shed(f"queue depth {self._waiting} reached the limit")
+
+        buckets = []
+        if user_id is not None:
+            buckets.append(self._bucket(self._user_buckets, user_id, self.user_rate, self.user_burst))
+        if channel_id is not None:
+            buckets.append(self._bucket(self._channel_buckets, channel_id, self.channel_rate, self.channel_burst))
+        delay = max([bucket.reserve() for bucket in buckets], default=0.0)
+        if delay > self.max_wait:
+            for bucket in buckets:
+                bucket.refund()
+            self._shed(f"rate limited for {delay:.1f}s")
+
+        enqueued_at = time.monotonic()
+        self._waiting += 1
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+            await self._acquire(priority)
+        finally:
+            self._waiting -= 1
+
+        waited = time.monotonic() - enqueued_at
+        observe_stage("queue_wait", waited)
+        self._stats["admitted"] += 1
+        self._stats["wait_seconds_total"] += waited
+        self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority):
+        if self._active < self.max_concurrency and not self._heap:
+            self._active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (priority, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed to us just as we were cancelled; pass it on
+                self._release()
+            else:
+                future.cancel()
+            raise
+
+    def _release(self):
+        """Hand the slot to the next waiter, or free it."""
+        while self._heap:
+            _, _, future = heapq.heappop(self._heap)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    async def run(self, fn, *args, user_id=None, channel_id=None, priority=PRIORITY_AMBIENT):
+        """Run blocking `fn(*args)` on the scheduler's executor, retrying quota errors with jitter."""
+        async with self.slot(user_id=user_id, channel_id=channel_id, priority=priority):
+            loop = asyncio.get_running_loop()
+            for attempt in range(self.max_retries + 1):
+                try:
+                    return await loop.run_in_executor(self.executor, functools.partial(fn, *args))
+                except quota_errors() as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self.retry_base_delay * (2 ** attempt) * random.uniform(0.5, 1.5)
+                    self._stats["retries"] += 1
+                    self.logger.warning(f"Gemini quota error, retrying in {delay:.2f} seconds.", exc_info=e)
+                    await asyncio.sleep(delay)
+
+    def stats(self):
+        """Return queue depth, concurrency, shedding, retry and wait-time statistics."""
+        stats = dict(self._stats)
+        stats["queue_depth"] = self._waiting
+        stats["active"] = self._active
+        stats["wait_seconds_avg"] = stats["wait_seconds_total"] / stats["admitted"] if stats["admitted"] else 0.0
+        return stats
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,189 @@
+import asyncio, json, time, uuid
+import redis
+from utils.logging import Logger
+
+# Delete the lock only if we still own it
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class _LeaderCancelled(Exception):
+    """Set on a shared future when its leader was cancelled; followers retry and one takes over."""
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution.
+
+    Within a process, callers with an in-flight key await the same future; if the
+    leader is cancelled, a waiting caller runs the call instead. With a
+    Redis client, one replica takes a lock per key and publishes its result; the
+    others wait on a pub/sub channel and fall back to running the call themselves
+    if the leader fails or times out.
+    """
+
+    def __init__(self, redis_client=None, lock_ttl=120, result_ttl=30, logger=None):
+        self.logger = logger or Logger.get_logger(
+            name=__name__,
+            log_level="DEBUG",
+            log_file="logs/singleflight.log"
+        )
+        self.client = redis_client
+        self.lock_ttl = lock_ttl
+        self.result_ttl = result_ttl
+        self._in_flight = {}
+        self._release_lock = redis_client.register_script(RELEASE_LOCK_SCRIPT) if redis_client else None
+        self._stats = {
+            "calls": 0,
+            "executions": 0,
+            "coalesced_local": 0,
+            "coalesced_remote": 0,
+            "remote_fallbacks": 0,
+            "leader_cancellations": 0,
+        }
+
+    async def _follow(self, key):
+        """Wait for the in-flight call for `key`; returns (True, result), or (False, None) if there is none."""
+        while (future := self._in_flight.get(key)) is not None:
+            self._stats["coalesced_local"] += 1
+            try:
+                return True, await asyncio.shield(future)
+            except _LeaderCancelled:
+                # The leader's caller went away; the first follower to get here leads the retry
+                continue
+        return False, None
+
+    def _lead(self, key):
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        return future
+
+    def _abandon(self, future, error):
+        """Fail the shared future; a cancelled leader makes followers retry instead of failing."""
+        if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+            self._stats["leader_cancellations"] += 1
+            error = _LeaderCancelled()
+        future.set_exception(error)
+        future.exception()  # Mark as retrieved when nobody else is waiting
+
+    async def do(self, key, fn):
+        """Return the result of `fn()`, sharing it with concurrent calls for the same key."""
+        self._stats["calls"] += 1
+        found, result = await self._follow(key)
+        if found:
+            return result
+
+        future = self._lead(key)
+        try:
+            result = await self._execute(key, fn)
+        except (Exception, asyncio.CancelledError) as e:
+            self._abandon(future, e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._in_flight[key]
+
+    async def stream(self, key, fn):
+        """Yield the text deltas of the async iterator `fn()`, coalescing concurrent streams for the same key.
+
+        The leader yields deltas as they arrive; concurrent callers (streaming or not) get
+        the joined text once it is complete. Coalescing is in-process only.
+        """
+        self._stats["calls"] += 1
+        found, result = await self._follow(key)
+        if found:
+            yield result
+            return
+
+        future = self._lead(key)
+        parts = []
+        try:
+            self._stats["executions"] += 1
+            async for delta in fn():
+                parts.append(delta)
+                yield delta
+        except (Exception, asyncio.CancelledError, GeneratorExit) as e:
+            self._abandon(future, e)
+            raise
+        else:
+            future.set_result("".join(parts))
+        finally:
+            del self._in_flight[key]
+
+    async def _execute(self, key, fn):
+        if self.client is None:
+            return await self._run(fn)
+
+        lock_key = f"singleflight:lock:{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self.client.set(lock_key, token, nx=True, px=self.lock_ttl * 1000)
+        except redis.RedisError as e:
+            self.logger.error("Failed to acquire single-flight lock, running locally.", exc_info=e)
+            return await self._run(fn)
+
+        if not acquired:
+            result = await self._wait_for_leader(key)
+            if result is not None:
+                self._stats["coalesced_remote"] += 1
+                return result
+            self._stats["remote_fallbacks"] += 1
+            return await self._run(fn)
+
+        try:
+            result = await self._run(fn)
+            await self._publish(key, result)
+            return result
+        finally:
+            try:
+                await self._release_lock(keys=[lock_key], args=[token])
+            except redis.RedisError as e:
+                self.logger.error("Failed to release single-flight lock.", exc_info=e)
+
+    async def _run(self, fn):
+        self._stats["executions"] += 1
+        return await fn()
+
+    async def _publish(self, key, result):
+        payload = json.dumps({"result": result})
+        try:
+            pipeline = self.client.pipeline()
+            pipeline.set(f"singleflight:result:{key}", payload, ex=self.result_ttl)
+            pipeline.publish(f"singleflight:channel:{key}", payload)
+            await pipeline.execute()
+        except redis.RedisError as e:
+            self.logger.error("Failed to publish single-flight result.", exc_info=e)
+
+    async def _wait_for_leader(self, key):
+        """Wait for another replica's result; returns None on timeout or error."""
+        pubsub = self.client.pubsub()
+        try:
+            await pubsub.subscribe(f"singleflight:channel:{key}")
+            # The leader may have finished before we subscribed
+            payload = await self.client.get(f"singleflight:result:{key}")
+            deadline = time.monotonic() + self.lock_ttl
+            while payload is None and time.monotonic() < deadline:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is not None:
+                    payload = message["data"]
+                elif not await self.client.exists(f"singleflight:lock:{key}"):
+                    # The leader released the lock without publishing, i.e. it failed
+                    payload = await self.client.get(f"singleflight:result:{key}")
+                    break
+            return json.loads(payload)["result"] if payload is not None else None
+        except redis.RedisError as e:
+            self.logger.error("Error waiting for single-flight result.", exc_info=e)
+            return None
+        finally:
+            await pubsub.aclose()
+
+    def stats(self):
+        """Return call, execution and coalescing counters."""
+        stats = dict(self._stats)
+        stats["in_flight"] = len(self._in_flight)
+        return stats
@@ -0,0 +1,134 @@
+"""Streaming sitemap parsing and a query-relevance index over the sitemap URLs.
+
+Sitemaps are read with ``iterparse`` so large files are never held as a full tree.
+Gzip-compressed sitemaps and sitemap index files are supported; an index's child
+sitemaps are read from the index's directory when present there, otherwise fetched.
+"""
+import gzip, os, re, urllib.request
+import xml.etree.ElementTree as ET
+from urllib.parse import urlsplit, urlunsplit
+from utils.retrieval import DocumentIndex
+
+SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+# Path segments that carry no meaning for matching
+SLUG_STOPWORDS = {"docs", "doc", "www", "html", "htm", "index", "new"}
+SLUG_SPLIT = re.compile(r"[/\-_.]+")
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def normalize_url(url):
+    """Normalize a URL for deduplication: lowercase scheme and host, no fragment or trailing slash."""
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ""))
+
+
+def slug_tokens(url):
+    """Return the meaningful words of a URL's path, e.g. `.../2-collect-api-keys` -> collect, api, keys."""
+    words = SLUG_SPLIT.split(urlsplit(url).path.lower())
+    return [word for word in words if word and not word.isdigit() and word not in SLUG_STOPWORDS]
+
+
+def _open_sitemap(source):
+    """Open a sitemap path or URL as a binary stream, transparently decompressing gzip."""
+    if re.match(r"https?://", source):
+        stream = urllib.request.urlopen(source, timeout=30)
+    else:
+        stream = open(source, 'rb')
+    magic = stream.peek(2)[:2] if hasattr(stream, "peek") else b""
+    if magic == GZIP_MAGIC or source.endswith(".gz"):
+        return gzip.GzipFile(fileobj=stream)
+    return stream
+
+
+def _resolve_child(loc, base_dir):
+    """Prefer a local copy of a child sitemap next to the index over fetching it."""
+    if base_dir is None:
+        return loc
+    local_path = os.path.join(base_dir, os.path.basename(urlsplit(loc).path))
+    return local_path if os.path.exists(local_path) else loc
+
+
+def iter_sitemap_urls(source, max_depth=2):
+    """Yield every page URL in a sitemap, following sitemap index files up to `max_depth` levels."""
+    base_dir = None if re.match(r"https?://", source) else os.path.dirname(os.path.abspath(source))
+    child_sitemaps = []
+    with _open_sitemap(source) as stream:
+        for _, element in ET.iterparse(stream, events=("end",)):
+            if element.tag == f"{SITEMAP_NS}url":
+                loc = element.findtext(f"{SITEMAP_NS}loc")
+                if loc:
+                    yield loc.strip()
+                element.clear()
+            elif element.tag == f"{SITEMAP_NS}sitemap":
+                loc = element.findtext(f"{SITEMAP_NS}loc")
+                if loc:
+                    child_sitemaps.append(loc.strip())
+                element.clear()
+    if max_depth > 0:
+        for loc in child_sitemaps:
+            yield from iter_sitemap_urls(_resolve_child(loc, base_dir), max_depth - 1)
+
+
+class SitemapIndex:
+    """Deduplicated sitemap URLs, searchable by their slugs and the PDF pages they cover."""
+
+    def __init__(self, page_boost=1.0):
+        self.page_boost = page_boost
+        self.urls = []
+        self.duplicates = 0
+        self.url_pages = []
+        self.page_urls = {}
+        # One single-chunk "page" per URL, keyed by the URL's position in self.urls
+        self.slug_index = DocumentIndex(chunk_size=64, chunk_overlap=0)
+
+    def __len__(self):
+        return len(self.urls)
+
+    def build(self, urls, doc_index=None):
+        """Index the URLs, associating each with the PDF pages that best match its slug."""
+        seen = set()
+        self.urls, self.duplicates = [], 0
+        for url in urls:
+            key = normalize_url(url)
+            if key in seen:
+                self.duplicates += 1
+                continue
+            seen.add(key)
+            self.urls.append(url)
+
+        slugs = [" ".join(slug_tokens(url)) for url in self.urls]
+        self.slug_index.build({url_id: slug for url_id, slug in enumerate(slugs)})
+
+        self.url_pages, self.page_urls = [], {}
+        for url_id, slug in enumerate(slugs):
+            pages = set()
+            if slug and doc_index is not None:
+                pages = {page for page, _, _ in doc_index.search(slug, top_k=2)}
+            self.url_pages.append(pages)
+            for page in pages:
+                self.page_urls.setdefault(page, []).append(url_id)
+        return self
+
+    def search(self, query, pages=(), top_k=5):
+        """Return up to top_k URLs matching the query's words or covering the given PDF pages."""
+        scores = {}
+        if len(self.slug_index):
+            chunk_scores = self.slug_index.score(query)
+            for chunk_id in chunk_scores.nonzero()[0]:
+                url_id = int(self.slug_index.chunk_pages[chunk_id])
+                scores[url_id] = scores.get(url_id, 0.0) + float(chunk_scores[chunk_id])
+        for page in set(pages):
+            for url_id in self.page_urls.get(page, ()):
+                scores[url_id] = scores.get(url_id, 0.0) + self.page_boost
+        ranked = sorted(scores, key=lambda url_id: (-scores[url_id], url_id))
+        return [self.urls[url_id] for url_id in ranked[:top_k]]
+
+    def all_links(self):
+        """Render every URL as the prompt's link lines."""
+        return self.format_links(self.urls)
+
+    @staticmethod
+    def format_links(urls):
+        """Render URLs as the prompt's link lines."""
+        return "\n".join(f"Link: {url}" for url in urls)
@@ -0,0 +1,77 @@
+"""Startup orchestration: timed, concurrent initialization phases and the readiness signal."""
+import asyncio, inspect, time
+from contextlib import contextmanager
+from utils.logging import Logger
+
+WARMING_UP_MESSAGE = "I'm still warming up and loading the documentation, please ask again in a moment. ⏳"
+
+
+class NotReady(Exception):
+    """Raised when a question arrives before the documentation has been loaded."""
+
+
+class Startup:
+    """Runs startup phases, concurrently where they are independent, and logs how long each took.
+
+    A phase is a blocking function (run in a worker thread) or an awaitable. `background`
+    runs a phase without waiting for it, e.g. parsing the documents while the gateways
+    connect; `mark_ready` records when the process can answer questions.
+    """
+
+    def __init__(self, logger=None):
+        self.logger = logger or Logger.get_logger(
+            name=__name__,
+            log_level="DEBUG",
+            log_file="logs/startup.log"
+        )
+        self.started = time.monotonic()
+        self.timings = {}
+        self.ready_seconds = None
+        self._tasks = set()
+
+    def _record(self, name, seconds):
+        self.timings[name] = seconds
+        self.logger.info(f"Startup phase {name} took {seconds:.2f} seconds.")
+
+    @contextmanager
+    def phase(self, name):
+        """Time a synchronous block, such as imports."""
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self._record(name, time.monotonic() - start_time)
+
+    async def run(self, name, step, *args):
+        """Run one phase: await `step` if it is awaitable, otherwise call it in a worker thread."""
+        start_time = time.monotonic()
+        try:
+            if inspect.isawaitable(step):
+                return await step
+            return await asyncio.to_thread(step, *args)
+        finally:
+            self._record(name, time.monotonic() - start_time)
+
+    async def gather(self, **steps):
+        """Run independent phases concurrently; returns their results by name."""
+        results = await asyncio.gather(*(self.run(name, step) for name, step in steps.items()))
+        return dict(zip(steps, results))
+
+    def background(self, awaitable):
+        """Run an awaitable (typically `run(...)`) as a task that is kept alive until done."""
+        task = asyncio.ensure_future(awaitable)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def mark_ready(self):
+        """Record that the process can answer questions and log the phase timings."""
+        self.ready_seconds = time.monotonic() - self.started
+        phases = ", ".join(f"{name}={seconds:.2f}s" for name, seconds in self.timings.items())
+        self.logger.info(f"Ready after {self.ready_seconds:.2f} seconds ({phases}).")
+
+    def stats(self):
+        """Return each phase's duration and the time until ready, in seconds."""
+        stats = {f"{name}_seconds": seconds for name, seconds in self.timings.items()}
+        stats["ready_seconds"] = self.ready_seconds if self.ready_seconds is not None else -1.0
+        return stats
@@ -0,0 +1,86 @@
+import time
+from utils.logging import Logger
+from utils.metrics import observe_stage
+
+
+def split_at_boundary(text, max_length):
+    """Split off the longest head of `text` within max_length, preferring a newline or space boundary."""
+    if len(text) <= max_length:
+        return text, ""
+    cut = text.rfind("\n", 0, max_length)
+    if cut <= 0:
+        cut = text.rfind(" ", 0, max_length)
+    if cut <= 0:
+        cut = max_length
+    return text[:cut], text[cut:].lstrip()
+
+
+class ProgressiveSender:
+    """Posts a streamed response right away and keeps editing it as more text arrives.
+
+    `post(text)` must send a new message and return a handle for it; `edit(handle, text)`
+    replaces that message's text. Edits are throttled to `edit_interval` seconds and a
+    new message is started whenever the current one would exceed `max_length`.
+    """
+
+    def __init__(self, post, edit, max_length, edit_interval=1.0, logger=None):
+        self.logger = logger or Logger.get_logger(
+            name=__name__,
+            log_level="DEBUG",
+            log_file="logs/streaming.log"
+        )
+        self.post = post
+        self.edit = edit
+        self.max_length = max_length
+        self.edit_interval = edit_interval
+        self.time_to_first_byte = None
+        self._start_time = None
+
+    async def send(self, deltas):
+        """Consume an async iterator of text deltas and return the full response text."""
+        self._start_time = time.monotonic()
+        parts = []
+        buffer = ""     # Text of the message currently being built
+        sent = ""       # What the platform currently shows for that message
+        handle = None
+        last_update = 0.0
+
+        async for delta in deltas:
+            parts.append(delta)
+            buffer += delta
+
+            # Roll over to a new message once the current one is full
+            while len(buffer) > self.max_length:
+                head, buffer = split_at_boundary(buffer, self.max_length)
+                await self._flush(handle, head)
+                handle, sent = None, ""
+
+            now = time.monotonic()
+            if not buffer.strip():
+                continue
+            if handle is None:
+                handle = await self._flush(None, buffer)
+                sent, last_update = buffer, now
+            elif buffer != sent and now - last_update >= self.edit_interval:
+                await self._flush(handle, buffer)
+                sent, last_update = buffer, now
+
+        if buffer.strip() and buffer != sent:
+            await self._flush(handle, buffer)
+
+        self.logger.info(
+            f"Streamed {sum(len(part) for part in parts)} characters in {time.monotonic() - self._start_time:.2f} seconds "
+            f"(time to first byte: {self.time_to_first_byte or 0:.2f} seconds)."
+        )
+        return "".join(parts)
+
+    async def _flush(self, handle, text):
+        """Post `text` as a new message, or edit the existing one; returns the handle."""
+        if handle is None:
+            handle = await self.post(text)
+            if self.time_to_first_byte is None:
+                self.time_to_first_byte = time.monotonic() - self._start_time
+                observe_stage("time_to_first_byte", self.time_to_first_byte)
+            return handle
+        await self.edit(handle, text)
+        return handle
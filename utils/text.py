@@ -0,0 +1,14 @@
+"""Tokenizing helpers with no third-party dependencies, shared by gateways and workers."""
+import re
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens for indexing."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def estimate_tokens(text):
+    """Rough model token estimate (~4 characters per token)."""
+    return max(1, len(text) // 4)
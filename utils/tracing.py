@@ -0,0 +1,21 @@
+import contextvars, logging, uuid
+
+# Set once per incoming event; asyncio tasks copy the context, so concurrent requests don't mix
+trace_id_var = contextvars.ContextVar("trace_id", default="-")
+platform_var = contextvars.ContextVar("platform", default="-")
+
+
+def new_trace(platform):
+    """Start a trace for an incoming event and return its ID."""
+    trace_id = uuid.uuid4().hex[:12]
+    trace_id_var.set(trace_id)
+    platform_var.set(platform)
+    return trace_id
+
+
+class TraceIdFilter(logging.Filter):
+    """Adds the current trace ID to every log record as `trace_id`."""
+
+    def filter(self, record):
+        record.trace_id = trace_id_var.get()
+        return True